@@ -11,7 +11,7 @@ import logging
 import threading
 import time
 import os
-from typing import List, Optional, Any
+from typing import Callable, List, Optional, Any
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +34,8 @@ class SharedEmbeddingModel:
         self._ready_event = threading.Event()
         self._load_error: Optional[Exception] = None
         self._is_loading = False
+        # 模型加载完成后在加载线程中执行的预热任务（如意图路由首次推理）
+        self._warmup_tasks: List[Callable[[], Any]] = []
         
         # 🔴 CRITICAL: 检查是否强制离线模式（通过环境变量）
         self._force_offline = os.environ.get("HF_HUB_OFFLINE", "").lower() in ("1", "true", "yes")
@@ -49,6 +51,17 @@ class SharedEmbeddingModel:
                 _shared_model_instance = cls(model_name)
             return _shared_model_instance
 
+    def add_warmup_task(self, task: Callable[[], Any]):
+        """
+        注册预热任务（在后台加载线程中、模型就绪后执行）
+        
+        用于提前触发 tokenizer 和首次前向推理，避免首个用户请求承担冷启动开销。
+        如果模型已加载完成，则不再执行（预热已无意义）。
+        """
+        with _model_lock:
+            if self._model is None:
+                self._warmup_tasks.append(task)
+
     def start_loading(self):
         """触发后台加载（如果是首次调用）"""
         with _model_lock:
@@ -92,6 +105,24 @@ class SharedEmbeddingModel:
         finally:
             self._ready_event.set()
             self._is_loading = False
+        
+        # 模型就绪后继续在本线程中预热，不阻塞等待 ready 的调用方
+        if self._model is not None:
+            self._run_warmup_tasks()
+    
+    def _run_warmup_tasks(self):
+        """执行已注册的预热任务（失败不影响正常功能）"""
+        with _model_lock:
+            tasks, self._warmup_tasks = self._warmup_tasks, []
+        
+        start = time.time()
+        for task in tasks:
+            try:
+                task()
+            except Exception as e:
+                logger.debug(f"[SharedModel] 预热任务失败（忽略）: {e}")
+        if tasks:
+            logger.info(f"[SharedModel] 预热完成，耗时 {time.time() - start:.2f}s")
     
     def _configure_hf_environment(self):
         """配置 Hugging Face Hub 环境变量，增强网络稳定性"""
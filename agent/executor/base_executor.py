@@ -8,7 +8,7 @@ Base Executor - 执行器基类
 """
 
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from abc import ABC, abstractmethod
 from agent.tools.config import Config
 
@@ -23,6 +23,9 @@ class BaseExecutor(ABC):
     基类提供统一的错误处理和日志格式。
     """
     
+    # 持有 emit 回调的子组件属性名（Agent 注入 emit 时沿这些属性向下传递）
+    __emit_attrs__: Tuple[str, ...] = ()
+    
     def __init__(self, config: Config, emit_callback=None):
         """
         初始化执行器
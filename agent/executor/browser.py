@@ -42,6 +42,8 @@ class BrowserExecutor(BaseExecutor):
     - 处理登录和验证码（请求用户输入）
     """
     
+    __emit_attrs__ = ("user_input_manager",)
+    
     def __init__(self, config: Config, emit_callback: Optional[Callable] = None):
         """
         初始化浏览器执行器
@@ -30,6 +30,8 @@ class EmailExecutor:
     - 压缩文件
     """
     
+    __emit_attrs__ = ("user_input_manager",)
+    
     def __init__(self, config: Config, emit_callback: Optional[Callable] = None):
         """
         初始化邮件执行器
@@ -33,6 +33,8 @@ class SystemTools(BaseExecutor):
     - 系统命令执行（未来扩展）
     """
     
+    __emit_attrs__ = ("code_interpreter",)
+    
     def __init__(self, config: Config, emit_callback=None):
         """
         初始化系统工具
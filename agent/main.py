@@ -22,13 +22,20 @@ except ImportError:
 
 import sys
 import logging
+import threading
 import time
 import json
 import traceback
 import contextvars
-from typing import Dict, Any, Optional, Callable, Set
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Callable, Set
 from pathlib import Path
 
+try:
+    import orjson  # 可选：C 实现，直接输出 UTF-8，中文事件无需逐字符转义
+except ImportError:
+    orjson = None
+
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -51,6 +58,22 @@ logger = logging.getLogger(__name__)
 _emit_context: contextvars.ContextVar[Optional[Callable]] = contextvars.ContextVar('emit_callback', default=None)
 
 
+@dataclass(slots=True)
+class ProgressEvent:
+    """
+    发往前端的进度事件
+
+    使用 slots 避免每个事件携带 __dict__，仅在 IPC 边界才转换为 dict。
+    """
+    type: str
+    timestamp: float
+    data: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的 dict（IPC 边界使用）"""
+        return {"type": self.type, "timestamp": self.timestamp, "data": self.data}
+
+
 class DeskJarvisAgent:
     """
     DeskJarvis Agent - Facade Layer
@@ -76,8 +99,12 @@ class DeskJarvisAgent:
         
         # 2. 初始化 Intent Router (使用共享嵌入模型)
         self.embedding_model = SharedEmbeddingModel.get_instance()
-        self.embedding_model.start_loading()  # 后台预加载
         self.intent_router = IntentRouter(self.embedding_model)
+        # 模型加载后在同一后台线程中预跑一次 detect，缓存意图 Embeddings 并预热 tokenizer
+        self.embedding_model.add_warmup_task(
+            lambda: self.intent_router.detect("warmup", threshold=1.0)
+        )
+        self.embedding_model.start_loading()  # 后台预加载
         
         # 3. 记忆系统 (懒加载，但在 facade 中声明)
         self._memory: Optional[MemoryManager] = None
@@ -105,7 +132,7 @@ class DeskJarvisAgent:
         if self._memory is None:
             logger.info("Initializing MemoryManager...")
             start = time.time()
-            self._memory = MemoryManager()
+            self._memory = MemoryManager(vector_index_params=self.config.vector_index)
             logger.info(f"MemoryManager ready in {time.time() - start:.2f}s")
         return self._memory
         
@@ -120,7 +147,8 @@ class DeskJarvisAgent:
         """
         递归注入 emit 回调到所有需要的地方
         
-        消除硬编码的 hasattr 补丁，自动发现并设置所有 emit 属性
+        只沿着类上静态声明的 __emit_attrs__（持有 emit 的子组件属性名）向下遍历，
+        避免对每个对象执行 dir() 反射。
         
         Args:
             obj: 要注入的对象
@@ -144,24 +172,11 @@ class DeskJarvisAgent:
             except Exception as e:
                 logger.warning(f"[SECURITY_SHIELD] 注入 emit 到 {type(obj).__name__} 失败: {e}")
         
-        # 递归处理对象的属性
-        for attr_name in dir(obj):
-            # 跳过私有属性和方法
-            if attr_name.startswith('_'):
-                continue
-            
-            try:
-                attr = getattr(obj, attr_name)
-                # 跳过方法和不可访问的属性
-                if callable(attr) or isinstance(attr, (int, float, str, bool, type(None))):
-                    continue
-                
-                # 递归处理对象属性
-                if isinstance(attr, object):
-                    self._inject_emit_recursive(attr, emit_callback, visited)
-            except Exception:
-                # 忽略无法访问的属性
-                continue
+        # 递归处理类声明的子组件
+        for attr_name in getattr(type(obj), '__emit_attrs__', ()):
+            child = getattr(obj, attr_name, None)
+            if child is not None:
+                self._inject_emit_recursive(child, emit_callback, visited)
 
     def _create_orchestrator(self, emit_callback: Callable) -> TaskOrchestrator:
         """
@@ -443,7 +458,9 @@ class DeskJarvisAgent:
         """
         # === 状态去重：记录最近发送的事件（用于去重检查）===
         _last_event_key: Optional[str] = None
-        _last_event_data: Optional[Dict[str, Any]] = None
+        # 工具在常驻工具线程中直接 emit，PlanExecutor 在调用线程中批量 emit：
+        # 串行化过滤、去重和发送，保证去重状态一致、输出行不交错
+        _emit_lock = threading.RLock()
         
         # === 事件映射：将底层事件映射到前端友好的事件类型 ===
         def map_event_type(event_type: str) -> Optional[str]:
@@ -529,9 +546,9 @@ class DeskJarvisAgent:
             return sanitized
         
         # === 构造过滤后的 emit 函数 ===
-        def emit(event_type: str, data: Dict[str, Any]):
+        def build_event(event_type: str, data: Dict[str, Any]) -> Optional[ProgressEvent]:
             """
-            过滤和精简事件，只发送前端需要的核心事件
+            过滤和精简事件，返回需要发送的前端事件（丢弃或去重时返回 None）
             
             功能：
             1. 事件类型白名单过滤
@@ -539,14 +556,14 @@ class DeskJarvisAgent:
             3. 状态去重（避免重复事件）
             4. 添加 step_index 和 total_steps（前端友好）
             """
-            nonlocal _last_event_key, _last_event_data
+            nonlocal _last_event_key
             
             # 1. 映射事件类型
             mapped_type = map_event_type(event_type)
             if not mapped_type:
                 # 不在白名单中的事件类型，直接丢弃
                 logger.debug(f"[UX_FILTER] 丢弃事件类型: {event_type}")
-                return
+                return None
             
             # 2. 精简事件数据
             sanitized_data = sanitize_event_data(mapped_type, data)
@@ -560,31 +577,58 @@ class DeskJarvisAgent:
             # 如果与上次事件完全相同，则去重
             if event_key == _last_event_key:
                 logger.debug(f"[UX_FILTER] 去重事件: {event_key}")
-                return
+                return None
             
             # 4. 记录本次事件
             _last_event_key = event_key
-            _last_event_data = sanitized_data.copy()
             
             # 5. 构造最终事件
-            event = {
-                "type": mapped_type,
-                "timestamp": time.time(),
-                "data": sanitized_data
-            }
-            
-            # 6. 发送到前端
+            return ProgressEvent(mapped_type, time.time(), sanitized_data)
+        
+        def send_events(events: List[ProgressEvent]):
+            """发送到前端（仅在此处转换为 dict）；多个事件合并为一次写入和一次 flush"""
             if progress_callback:
+                for event in events:
+                    try:
+                        progress_callback(event.to_dict())
+                        # 🔴 CRITICAL: 对于关键事件（如 request_input），确保立即刷新
+                        if event.type in ['request_input', 'waiting_for_input']:
+                            sys.stdout.flush()  # 立即刷新 stdout，确保消息立即发送
+                    except Exception as e:
+                        logger.error(f"[SECURITY_SHIELD] 进度回调失败: {e}")
+                return
+            
+            event_dicts = [event.to_dict() for event in events]
+            if orjson is not None:
                 try:
-                    progress_callback(event)
-                    # 🔴 CRITICAL: 对于关键事件（如 request_input），确保立即刷新
-                    if mapped_type in ['request_input', 'waiting_for_input']:
-                        import sys
-                        sys.stdout.flush()  # 立即刷新 stdout，确保消息立即发送
-                except Exception as e:
-                    logger.error(f"[SECURITY_SHIELD] 进度回调失败: {e}")
+                    payload = b"".join(orjson.dumps(event_dict) + b"\n" for event_dict in event_dicts)
+                    buffer = getattr(sys.stdout, "buffer", None)
+                    if buffer is not None:
+                        sys.stdout.flush()  # 先刷出文本层缓冲，保证输出顺序
+                        buffer.write(payload)
+                    else:
+                        # stdout 被替换为无 buffer 的对象（如 StringIO）时按文本写入
+                        sys.stdout.write(payload.decode("utf-8"))
+                    sys.stdout.flush()
+                    return
+                except TypeError:
+                    pass  # orjson 不支持的类型（如非 str 键），回退到标准 json
+            sys.stdout.write("".join(json.dumps(event_dict, ensure_ascii=False) + "\n" for event_dict in event_dicts))
+            sys.stdout.flush()
+        
+        def emit(event_type: str, data: Dict[str, Any]):
+            """过滤并发送事件；"batch" 事件（PlanExecutor 合并的事件组）逐个过滤后一次性发送"""
+            if event_type == "batch":
+                items = [(item["event"], item["data"]) for item in data.get("events", [])]
             else:
-                print(json.dumps(event, ensure_ascii=False), flush=True)
+                items = [(event_type, data)]
+            with _emit_lock:
+                events = [event for event in (build_event(name, payload) for name, payload in items) if event]
+                if events:
+                    send_events(events)
+        
+        # PlanExecutor 据此决定是否把连续事件合并为一个 "batch" 事件发送
+        emit.supports_batch = True
         
         # === 非阻塞等待嵌入模型就绪（最多等待3秒）===
         if not self.embedding_model.wait_until_ready(timeout=3.0):
@@ -8,15 +8,148 @@
 - 用户画像构建
 """
 
+import functools
+import hashlib
 import json
 import logging
+import os
 import re
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
-from collections import Counter, defaultdict
+from typing import Deque, Dict, Iterable, List, Any, Optional
+from collections import Counter, defaultdict, deque
+
+try:
+    import ahocorasick  # 可选：pyahocorasick，多关键词单次线性扫描
+except ImportError:
+    ahocorasick = None
 
 logger = logging.getLogger(__name__)
 
+# 预编译正则（指令标准化 / 命名风格检测）
+_RE_NUM = re.compile(r'\d+')
+_RE_QUOTED = re.compile(r'["\'].*?["\']')
+_RE_PATH = re.compile(r'/[\w\./]+')
+_RE_WS = re.compile(r'\s+')
+_RE_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_RE_NUM_PREFIX = re.compile(r'^\d+_')
+_RE_VERSION = re.compile(r'_v\d+')
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_instruction(instruction: str) -> str:
+    """标准化指令（纯函数，结果缓存：指令历史中重复指令占多数）"""
+    # 移除数字、路径、文件名等变化部分
+    normalized = _RE_NUM.sub('#NUM#', instruction)
+    normalized = _RE_QUOTED.sub('#STR#', normalized)
+    normalized = _RE_PATH.sub('#PATH#', normalized)
+    normalized = _RE_WS.sub(' ', normalized).strip().lower()
+    return normalized
+
+
+def _parse_steps(record: Dict) -> List[Dict]:
+    """解析记录中的步骤（数据库中可能是 JSON 字符串），不修改传入的记录"""
+    steps = record.get("steps", [])
+    if not isinstance(steps, str):
+        return steps
+    try:
+        return json.loads(steps)
+    except Exception:
+        return []
+
+
+@functools.lru_cache(maxsize=4096)
+def _step_types_of_json(steps_json: str) -> tuple:
+    """步骤 JSON 文本 -> 动作类型序列（纯函数，按文本缓存：重复指令的步骤文本相同）"""
+    try:
+        steps = json.loads(steps_json)
+    except Exception:
+        return ()
+    return tuple(step.get("type", "unknown") for step in steps)
+
+
+def _step_types(record: Dict) -> tuple:
+    """记录的动作类型序列"""
+    steps = record.get("steps", [])
+    if isinstance(steps, str):
+        return _step_types_of_json(steps)
+    return tuple(step.get("type", "unknown") for step in steps)
+
+
+# (epoch 秒, 对应的 isoformat 字符串)；整体替换元组，多线程读取不会拿到不一致的一半
+_iso_cache = (0, "")
+
+
+def _now_iso() -> str:
+    """
+    当前时间的 isoformat 字符串（秒级精度）
+    
+    同一秒内的多次调用复用已格式化的字符串，避免每条记录都构造 datetime。
+    """
+    global _iso_cache
+    sec = int(time.time())
+    cached_sec, cached_iso = _iso_cache
+    if sec == cached_sec:
+        return cached_iso
+    iso = datetime.fromtimestamp(sec).isoformat()
+    _iso_cache = (sec, iso)
+    return iso
+
+
+def _hour_of(timestamp: str) -> Optional[int]:
+    """
+    提取 ISO 时间戳中的小时
+    
+    本模块写入的时间戳都是 isoformat()（YYYY-MM-DDTHH:...），小时位于固定偏移，
+    直接切片即可；其他格式回退到 datetime 解析。
+    """
+    if len(timestamp) >= 13 and timestamp[10] in "T " and timestamp[11:13].isdigit():
+        hour = int(timestamp[11:13])
+        return hour if hour < 24 else None
+    try:
+        return datetime.fromisoformat(timestamp).hour
+    except Exception:
+        return None
+
+
+def _tail(items, n: int) -> List[Dict]:
+    """
+    取末尾 n 条为 list（deque / 列式历史不支持切片）
+    
+    先一次性复制成 list 再切片：其他线程可能同时追加，直接迭代 deque 会抛出 RuntimeError。
+    """
+    items = list(items)
+    return items[-n:] if n > 0 else []
+
+
+@functools.lru_cache(maxsize=1024)
+def _classify_name(name: str) -> Optional[str]:
+    """
+    识别文件命名风格（结果缓存：每次行为分析都会重扫同一批历史文件名）
+    
+    Returns:
+        "date_prefix" / "number_prefix" / "version_suffix"，无法识别时返回 None
+    """
+    if _RE_DATE.search(name):
+        return "date_prefix"
+    if _RE_NUM_PREFIX.search(name):
+        return "number_prefix"
+    if _RE_VERSION.search(name):
+        return "version_suffix"
+    return None
+
+
+def _build_automaton(words) -> Optional[Any]:
+    """构建 Aho-Corasick 自动机（未安装 pyahocorasick 时返回 None）"""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
 
 class EmotionAnalyzer:
     """情绪分析器"""
@@ -54,17 +187,20 @@ class EmotionAnalyzer:
                 "suggestion": "..."
             }
         """
-        emotion_scores = {}
-        keywords_found = {}
-        
-        for emotion, keywords in self.EMOTION_KEYWORDS.items():
-            found = []
-            for kw in keywords:
-                if kw in text:
-                    found.append(kw)
-            if found:
-                emotion_scores[emotion] = len(found)
-                keywords_found[emotion] = found
+        keywords_found: Dict[str, List[str]] = {}
+        
+        # 有自动机时一次扫描得到全部命中关键词，之后只做集合查询
+        if _EMOTION_AC is not None:
+            contains = {kw for _, kw in _EMOTION_AC.iter(text)}.__contains__
+        else:
+            contains = text.__contains__
+        
+        # 单层遍历展平的 (关键词, 情绪) 表，顺序与 EMOTION_KEYWORDS 一致
+        for kw, emotion in _EMOTION_KEYWORD_PAIRS:
+            if contains(kw):
+                keywords_found.setdefault(emotion, []).append(kw)
+        
+        emotion_scores = {emotion: len(found) for emotion, found in keywords_found.items()}
         
         if not emotion_scores:
             return {
@@ -103,20 +239,18 @@ class EmotionAnalyzer:
         emotion_counts = Counter(e.get("emotion", "neutral") for e in emotions_history)
         
         # 分析时间模式
-        time_emotions = defaultdict(list)
+        time_emotions = defaultdict(Counter)
         for e in emotions_history:
             timestamp = e.get("timestamp", "")
             if timestamp:
-                try:
-                    hour = datetime.fromisoformat(timestamp).hour
-                    time_emotions[hour].append(e.get("emotion", "neutral"))
-                except Exception:
-                    pass
+                hour = _hour_of(timestamp)
+                if hour is not None:
+                    time_emotions[hour][e.get("emotion", "neutral")] += 1
         
         # 找出高峰时段
         peak_times = {}
         for hour, emotions in time_emotions.items():
-            dominant = Counter(emotions).most_common(1)
+            dominant = emotions.most_common(1)
             if dominant:
                 peak_times[hour] = dominant[0][0]
         
@@ -131,6 +265,10 @@ class EmotionAnalyzer:
 class WorkflowDiscovery:
     """工作流自动发现"""
     
+    # 模式名称使用的关键动作词（按优先顺序）
+    ACTION_WORDS = ("下载", "整理", "删除", "重命名", "移动", "复制", "总结",
+                    "搜索", "打开", "关闭", "压缩", "解压", "转换", "处理")
+    
     def __init__(self, min_occurrences: int = 3, similarity_threshold: float = 0.6):
         """
         初始化工作流发现器
@@ -142,22 +280,9 @@ class WorkflowDiscovery:
         self.min_occurrences = min_occurrences
         self.similarity_threshold = similarity_threshold
     
-    def _normalize_instruction(self, instruction: str) -> str:
-        """标准化指令"""
-        # 移除数字、路径、文件名等变化部分
-        normalized = re.sub(r'\d+', '#NUM#', instruction)
-        normalized = re.sub(r'["\'].*?["\']', '#STR#', normalized)
-        normalized = re.sub(r'/[\w\./]+', '#PATH#', normalized)
-        normalized = re.sub(r'\s+', ' ', normalized).strip().lower()
-        return normalized
-    
     def _extract_action_sequence(self, steps: List[Dict]) -> List[str]:
         """从步骤中提取动作序列"""
-        actions = []
-        for step in steps:
-            step_type = step.get("type", "unknown")
-            actions.append(step_type)
-        return actions
+        return [step.get("type", "unknown") for step in steps]
     
     def find_patterns(self, instruction_history: List[Dict]) -> List[Dict]:
         """
@@ -177,42 +302,33 @@ class WorkflowDiscovery:
         normalized_groups = defaultdict(list)
         for record in instruction_history:
             instruction = record.get("instruction", "")
-            normalized = self._normalize_instruction(instruction)
+            normalized = _normalize_instruction(instruction)
             normalized_groups[normalized].append(record)
         
         # 找出重复的模式
         patterns = []
         for normalized, records in normalized_groups.items():
             if len(records) >= self.min_occurrences:
-                # 提取共同的动作序列
-                action_sequences = []
+                # 单次遍历：统计动作序列（找最常见的）并累计成功次数
+                seq_counter = Counter()
+                success_count = 0
                 for r in records:
-                    steps = r.get("steps", [])
-                    if isinstance(steps, str):
-                        try:
-                            steps = json.loads(steps)
-                        except Exception:
-                            steps = []
-                    action_sequences.append(self._extract_action_sequence(steps))
+                    seq_counter[_step_types(r)] += 1
+                    if r.get("success", True):
+                        success_count += 1
                 
-                # 找最常见的动作序列
-                if action_sequences:
-                    seq_counter = Counter(tuple(seq) for seq in action_sequences)
-                    most_common_seq = seq_counter.most_common(1)[0][0]
-                    
-                    # 成功率
-                    success_count = sum(1 for r in records if r.get("success", True))
-                    success_rate = success_count / len(records)
-                    
-                    patterns.append({
-                        "pattern_name": self._generate_pattern_name(records[0].get("instruction", "")),
-                        "normalized": normalized,
-                        "action_sequence": list(most_common_seq),
-                        "occurrences": len(records),
-                        "success_rate": success_rate,
-                        "example_instructions": [r.get("instruction", "")[:100] for r in records[:3]],
-                        "suggested_workflow": self._create_workflow_template(records[0])
-                    })
+                most_common_seq = seq_counter.most_common(1)[0][0]
+                success_rate = success_count / len(records)
+                
+                patterns.append({
+                    "pattern_name": self._generate_pattern_name(records[0].get("instruction", "")),
+                    "normalized": normalized,
+                    "action_sequence": list(most_common_seq),
+                    "occurrences": len(records),
+                    "success_rate": success_rate,
+                    "example_instructions": [r.get("instruction", "")[:100] for r in records[:3]],
+                    "suggested_workflow": self._create_workflow_template(records[0])
+                })
         
         # 按出现次数排序
         patterns.sort(key=lambda x: x["occurrences"], reverse=True)
@@ -220,11 +336,13 @@ class WorkflowDiscovery:
     
     def _generate_pattern_name(self, instruction: str) -> str:
         """生成模式名称"""
-        # 提取关键动作词
-        action_words = ["下载", "整理", "删除", "重命名", "移动", "复制", "总结", 
-                       "搜索", "打开", "关闭", "压缩", "解压", "转换", "处理"]
+        # 提取关键动作词（有自动机时单次扫描，结果仍按 ACTION_WORDS 顺序）
+        if _ACTION_AC is not None:
+            contains = {w for _, w in _ACTION_AC.iter(instruction)}.__contains__
+        else:
+            contains = instruction.__contains__
         
-        found_actions = [w for w in action_words if w in instruction]
+        found_actions = [w for w in self.ACTION_WORDS if contains(w)]
         
         if found_actions:
             return "+".join(found_actions[:3]) + "工作流"
@@ -232,12 +350,7 @@ class WorkflowDiscovery:
     
     def _create_workflow_template(self, record: Dict) -> Dict:
         """创建工作流模板"""
-        steps = record.get("steps", [])
-        if isinstance(steps, str):
-            try:
-                steps = json.loads(steps)
-            except Exception:
-                steps = []
+        steps = _parse_steps(record)
         
         return {
             "name": self._generate_pattern_name(record.get("instruction", "")),
@@ -249,26 +362,123 @@ class WorkflowDiscovery:
     def suggest_workflow(
         self, 
         current_instruction: str, 
-        patterns: List[Dict]
+        patterns: List[Dict],
+        pattern_index: Optional[Dict[str, Dict]] = None
     ) -> Optional[Dict]:
         """
         根据当前指令建议工作流
         
+        Args:
+            current_instruction: 当前指令
+            patterns: 已发现的模式列表
+            pattern_index: 可选的 {normalized: pattern} 索引，提供时 O(1) 查找
+        
         Returns:
             匹配的工作流建议，如果没有匹配则返回 None
         """
-        normalized = self._normalize_instruction(current_instruction)
-        
-        for pattern in patterns:
-            if pattern["normalized"] == normalized:
-                return {
-                    "pattern": pattern,
-                    "message": f"发现你经常执行「{pattern['pattern_name']}」"
-                              f"（已执行{pattern['occurrences']}次，成功率{pattern['success_rate']*100:.0f}%），"
-                              f"是否保存为快捷命令？"
-                }
+        normalized = _normalize_instruction(current_instruction)
         
-        return None
+        if pattern_index is not None:
+            pattern = pattern_index.get(normalized)
+        else:
+            pattern = next((p for p in patterns if p["normalized"] == normalized), None)
+        
+        if pattern is None:
+            return None
+        
+        return {
+            "pattern": pattern,
+            "message": f"发现你经常执行「{pattern['pattern_name']}」"
+                      f"（已执行{pattern['occurrences']}次，成功率{pattern['success_rate']*100:.0f}%），"
+                      f"是否保存为快捷命令？"
+        }
+
+
+# ========== 模块级共享的关键词表与自动机 ==========
+# 在导入时只构建一次，所有 EmotionAnalyzer / WorkflowDiscovery 实例共享，实例化无额外开销。
+_EMOTION_KEYWORD_PAIRS: tuple = ()
+_EMOTION_AC: Optional[Any] = None
+_ACTION_AC: Optional[Any] = None
+
+
+def reload_automata():
+    """
+    重建共享的关键词表与自动机
+    
+    导入后修改 EmotionAnalyzer.EMOTION_KEYWORDS 或 WorkflowDiscovery.ACTION_WORDS
+    不会自动生效，需要调用本函数重新构建。
+    """
+    global _EMOTION_KEYWORD_PAIRS, _EMOTION_AC, _ACTION_AC
+    _EMOTION_KEYWORD_PAIRS = tuple(
+        (kw, emotion)
+        for emotion, keywords in EmotionAnalyzer.EMOTION_KEYWORDS.items()
+        for kw in keywords
+    )
+    _EMOTION_AC = _build_automaton(kw for kw, _ in _EMOTION_KEYWORD_PAIRS)
+    _ACTION_AC = _build_automaton(WorkflowDiscovery.ACTION_WORDS)
+
+
+reload_automata()
+
+
+class _ActionColumns:
+    """
+    动作历史的列式存储（SoA）
+    
+    每条动作在写入时拆成 type / path / name / timestamp 几列，
+    各个行为分析器只遍历自己需要的那一列，避免反复对每条记录做 dict 查找。
+    原始记录保留在 records 中，用于导出和按记录迭代。
+    请求线程追加、维护线程导出/分析可能同时发生：追加和 snapshot() 在锁内进行，各列保持对齐。
+    """
+    
+    __slots__ = ("records", "types", "paths", "names", "timestamps", "_lock")
+    
+    def __init__(self, records: Iterable[Dict] = (), maxlen: Optional[int] = None):
+        self._lock = threading.Lock()
+        self.records: Deque[Dict] = deque(maxlen=maxlen)
+        self.types: Deque[str] = deque(maxlen=maxlen)
+        self.paths: Deque[str] = deque(maxlen=maxlen)
+        self.names: Deque[str] = deque(maxlen=maxlen)
+        self.timestamps: Deque[str] = deque(maxlen=maxlen)
+        for record in records:
+            self.append(record)
+    
+    def append(self, action: Dict):
+        """追加一条动作记录"""
+        params = action.get("params") or {}
+        path = params.get("path", "")
+        with self._lock:
+            self.records.append(action)
+            self.types.append(action.get("type", ""))
+            self.paths.append(path)
+            self.names.append(params.get("new_name", "") or path)
+            self.timestamps.append(action.get("timestamp", ""))
+    
+    def snapshot(self) -> "_ActionColumns":
+        """复制出当前内容（各列为 list），供其他线程安全地遍历"""
+        copy = _ActionColumns.__new__(_ActionColumns)
+        copy._lock = threading.Lock()
+        with self._lock:
+            copy.records = list(self.records)
+            copy.types = list(self.types)
+            copy.paths = list(self.paths)
+            copy.names = list(self.names)
+            copy.timestamps = list(self.timestamps)
+        return copy
+    
+    @property
+    def maxlen(self) -> Optional[int]:
+        return self.records.maxlen
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self.records))
+    
+    def __getitem__(self, index: int) -> Dict:
+        return self.records[index]
 
 
 class ProactiveLearner:
@@ -283,6 +493,8 @@ class ProactiveLearner:
         """
         self.confirmation_threshold = confirmation_threshold
         self.pending_confirmations = []  # 待确认的偏好
+        # (type, value, occurrences) -> 确认请求；偏好未变化时复用已生成的请求
+        self._confirm_cache: Dict[tuple, Dict] = {}
     
     def analyze_behavior(self, actions_history: List[Dict]) -> List[Dict]:
         """
@@ -296,6 +508,12 @@ class ProactiveLearner:
         """
         potential_preferences = []
         
+        # 统一转换为列式存储（AdvancedMemory 已直接以列式保存，取快照后遍历）
+        if isinstance(actions_history, _ActionColumns):
+            actions_history = actions_history.snapshot()
+        else:
+            actions_history = _ActionColumns(actions_history)
+        
         # 分析文件命名模式
         naming_patterns = self._analyze_naming_patterns(actions_history)
         potential_preferences.extend(naming_patterns)
@@ -315,23 +533,17 @@ class ProactiveLearner:
         
         return confirmable
     
-    def _analyze_naming_patterns(self, actions_history: List[Dict]) -> List[Dict]:
+    def _analyze_naming_patterns(self, actions_history: _ActionColumns) -> List[Dict]:
         """分析命名模式"""
         patterns = []
-        naming_styles = defaultdict(int)
+        naming_styles: Counter = Counter()
         
-        for action in actions_history:
-            step_type = action.get("type", "")
-            if step_type in ["file_rename", "file_create", "file_save"]:
-                name = action.get("params", {}).get("new_name", "") or action.get("params", {}).get("path", "")
-                
+        for step_type, name in zip(actions_history.types, actions_history.names):
+            if step_type in ("file_rename", "file_create", "file_save"):
                 # 检测命名风格
-                if re.search(r'\d{4}-\d{2}-\d{2}', name):
-                    naming_styles["date_prefix"] += 1
-                elif re.search(r'^\d+_', name):
-                    naming_styles["number_prefix"] += 1
-                elif re.search(r'_v\d+', name):
-                    naming_styles["version_suffix"] += 1
+                style = _classify_name(name)
+                if style is not None:
+                    naming_styles[style] += 1
         
         for style, count in naming_styles.items():
             if count >= self.confirmation_threshold:
@@ -351,17 +563,16 @@ class ProactiveLearner:
         
         return patterns
     
-    def _analyze_directory_patterns(self, actions_history: List[Dict]) -> List[Dict]:
+    def _analyze_directory_patterns(self, actions_history: _ActionColumns) -> List[Dict]:
         """分析目录使用模式"""
         patterns = []
-        directory_usage = defaultdict(int)
+        directory_usage: Counter = Counter()
+        dirname = os.path.dirname
         
-        for action in actions_history:
-            path = action.get("params", {}).get("path", "")
+        for path in actions_history.paths:
             if path:
                 # 提取目录
-                import os
-                directory = os.path.dirname(path)
+                directory = dirname(path)
                 if directory:
                     directory_usage[directory] += 1
         
@@ -377,24 +588,20 @@ class ProactiveLearner:
         
         return patterns
     
-    def _analyze_time_patterns(self, actions_history: List[Dict]) -> List[Dict]:
+    def _analyze_time_patterns(self, actions_history: _ActionColumns) -> List[Dict]:
         """分析时间模式"""
         patterns = []
-        hour_counts = defaultdict(int)
+        hour_counts: Counter = Counter()
         
-        for action in actions_history:
-            timestamp = action.get("timestamp", "")
+        for timestamp in actions_history.timestamps:
             if timestamp:
-                try:
-                    hour = datetime.fromisoformat(timestamp).hour
+                hour = _hour_of(timestamp)
+                if hour is not None:
                     hour_counts[hour] += 1
-                except Exception:
-                    pass
         
         # 找高峰时段
         if hour_counts:
-            peak_hour = max(hour_counts, key=hour_counts.get)
-            peak_count = hour_counts[peak_hour]
+            peak_hour, peak_count = hour_counts.most_common(1)[0]
             total = sum(hour_counts.values())
             
             if peak_count / total > 0.3:  # 某时段占比超过 30%
@@ -410,28 +617,66 @@ class ProactiveLearner:
     
     def create_confirmation_request(self, preference: Dict) -> Dict:
         """创建确认请求"""
+        # 使用稳定摘要（内置 hash() 对字符串按进程随机化，重启后 ID 会变）
+        value_digest = hashlib.blake2b(str(preference['value']).encode("utf-8"), digest_size=6).hexdigest()
         return {
-            "id": f"confirm_{preference['type']}_{hash(preference['value'])}",
+            "id": f"confirm_{preference['type']}_{value_digest}",
             "type": "preference_confirmation",
             "preference": preference,
             "question": preference.get("question", "是否确认这个偏好？"),
             "options": ["是", "否", "以后不再询问"],
             "timestamp": datetime.now().isoformat()
         }
+    
+    def create_confirmation_requests(self, preferences: List[Dict]) -> List[Dict]:
+        """
+        批量创建确认请求（带缓存）
+        
+        同一偏好（类型、值、出现次数均未变化）复用之前生成的请求对象；
+        缓存只保留本次仍然存在的偏好，避免无限增长。
+        """
+        cache: Dict[tuple, Dict] = {}
+        requests = []
+        for preference in preferences:
+            key = (preference["type"], str(preference["value"]), preference["occurrences"])
+            request = self._confirm_cache.get(key)
+            if request is None:
+                request = self.create_confirmation_request(preference)
+            cache[key] = request
+            requests.append(request)
+        self._confirm_cache = cache
+        return requests
 
 
 class AdvancedMemory:
     """高级记忆 - 整合情绪分析、工作流发现、主动学习"""
     
+    MAX_EMOTIONS = 100  # 只保留最近 100 条情绪
+    MAX_ACTIONS = 500   # 只保留最近 500 条动作
+    
     def __init__(self):
         """初始化高级记忆"""
         self.emotion_analyzer = EmotionAnalyzer()
         self.workflow_discovery = WorkflowDiscovery()
         self.proactive_learner = ProactiveLearner()
         
-        self.emotions_history: List[Dict] = []
-        self.actions_history: List[Dict] = []
+        # 固定容量环形缓冲：超出上限时自动丢弃最旧记录（O(1)）
+        self.emotions_history: Deque[Dict] = deque(maxlen=self.MAX_EMOTIONS)
+        self.actions_history = _ActionColumns(maxlen=self.MAX_ACTIONS)  # 列式存储，便于多遍分析
         self.discovered_patterns: List[Dict] = []
+        self._pattern_index: Dict[str, Dict] = {}  # normalized -> pattern
+        
+        # 动作历史版本号：每次记录动作递增，用于判断待确认列表是否需要重算
+        self._actions_generation = 0
+        self._confirmations_generation = -1
+        self._pending_confirmations: List[Dict] = []
+        self._pending_by_id: Dict[str, Dict] = {}
+        
+        # 记忆上下文缓存：(情绪版本号, 工作流版本号) 未变化时直接复用
+        self._emotions_generation = 0
+        self._patterns_generation = 0
+        self._ctx_cache_key: Optional[tuple] = None
+        self._ctx_value = ""
         
         logger.info("高级记忆已初始化")
     
@@ -442,47 +687,71 @@ class AdvancedMemory:
         # 记录到历史
         self.emotions_history.append({
             **result,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": _now_iso(),
             "text_preview": text[:100]
         })
-        
-        # 只保留最近 100 条
-        if len(self.emotions_history) > 100:
-            self.emotions_history = self.emotions_history[-100:]
+        self._emotions_generation += 1
         
         return result
     
     def record_action(self, action: Dict):
         """记录用户动作"""
-        action["timestamp"] = datetime.now().isoformat()
+        action["timestamp"] = _now_iso()
         self.actions_history.append(action)
-        
-        # 只保留最近 500 条
-        if len(self.actions_history) > 500:
-            self.actions_history = self.actions_history[-500:]
+        self._actions_generation += 1
     
     def discover_workflows(self, instruction_history: List[Dict]) -> List[Dict]:
         """发现工作流模式"""
         self.discovered_patterns = self.workflow_discovery.find_patterns(instruction_history)
+        self._rebuild_pattern_index()
         return self.discovered_patterns
     
+    def _rebuild_pattern_index(self):
+        """重建模式索引（discovered_patterns 变化后调用）"""
+        # 与线性扫描保持一致：同一 normalized 取第一个出现的模式
+        index: Dict[str, Dict] = {}
+        for pattern in self.discovered_patterns:
+            index.setdefault(pattern["normalized"], pattern)
+        self._pattern_index = index
+        self._patterns_generation += 1
+    
     def get_workflow_suggestion(self, instruction: str) -> Optional[Dict]:
         """获取工作流建议"""
         if not self.discovered_patterns:
             return None
-        return self.workflow_discovery.suggest_workflow(instruction, self.discovered_patterns)
+        return self.workflow_discovery.suggest_workflow(
+            instruction, self.discovered_patterns, self._pattern_index
+        )
+    
+    def _refresh_pending_confirmations(self):
+        """动作历史变化后重新生成待确认列表及其 id 索引"""
+        if self._confirmations_generation != self._actions_generation:
+            potential = self.proactive_learner.analyze_behavior(self.actions_history)
+            self._pending_confirmations = self.proactive_learner.create_confirmation_requests(potential)
+            self._pending_by_id = {p["id"]: p for p in self._pending_confirmations}
+            self._confirmations_generation = self._actions_generation
     
     def get_pending_confirmations(self) -> List[Dict]:
-        """获取待确认的偏好"""
-        potential = self.proactive_learner.analyze_behavior(self.actions_history)
-        return [self.proactive_learner.create_confirmation_request(p) for p in potential]
+        """获取待确认的偏好（动作历史未变化时直接返回上次结果）"""
+        self._refresh_pending_confirmations()
+        return list(self._pending_confirmations)
+    
+    def get_pending_confirmation_by_id(self, confirmation_id: str) -> Optional[Dict]:
+        """按 id 获取单个待确认项"""
+        self._refresh_pending_confirmations()
+        return self._pending_by_id.get(confirmation_id)
     
     def get_emotion_pattern(self) -> Dict:
         """获取情绪模式"""
-        return self.emotion_analyzer.get_emotion_pattern(self.emotions_history)
+        # 复制后分析：其他线程可能同时追加情绪记录
+        return self.emotion_analyzer.get_emotion_pattern(list(self.emotions_history))
     
     def get_memory_context(self) -> str:
-        """获取高级记忆上下文"""
+        """获取高级记忆上下文（情绪和工作流均未变化时返回缓存）"""
+        cache_key = (self._emotions_generation, self._patterns_generation)
+        if cache_key == self._ctx_cache_key:
+            return self._ctx_value
+        
         context_parts = []
         
         # 当前情绪状态
@@ -499,18 +768,23 @@ class AdvancedMemory:
                           for p in self.discovered_patterns[:3]]
             context_parts.append("**常用工作流**：\n" + "\n".join(pattern_items))
         
-        return "\n\n".join(context_parts) if context_parts else ""
+        self._ctx_value = "\n\n".join(context_parts) if context_parts else ""
+        self._ctx_cache_key = cache_key
+        return self._ctx_value
     
     def export_state(self) -> Dict:
         """导出状态（用于持久化）"""
         return {
-            "emotions_history": self.emotions_history[-50:],  # 只保留最近 50 条
-            "actions_history": self.actions_history[-100:],
+            "emotions_history": _tail(self.emotions_history, 50),  # 只保留最近 50 条
+            "actions_history": _tail(self.actions_history, 100),
             "discovered_patterns": self.discovered_patterns
         }
     
     def import_state(self, state: Dict):
         """导入状态"""
-        self.emotions_history = state.get("emotions_history", [])
-        self.actions_history = state.get("actions_history", [])
+        self.emotions_history = deque(state.get("emotions_history", []), maxlen=self.MAX_EMOTIONS)
+        self._emotions_generation += 1
+        self.actions_history = _ActionColumns(state.get("actions_history", []), maxlen=self.MAX_ACTIONS)
+        self._actions_generation += 1
         self.discovered_patterns = state.get("discovered_patterns", [])
+        self._rebuild_pattern_index()
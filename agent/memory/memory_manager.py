@@ -8,21 +8,117 @@
 4. 定期维护（压缩、清理）
 """
 
+import copy
 import json
 import logging
+import os
+import re
 import time
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Tuple
 import uuid
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from agent.memory.structured_memory import StructuredMemory
 from agent.memory.vector_memory import VectorMemory
 from agent.memory.advanced_memory import AdvancedMemory
 
+try:
+    import orjson  # 可选：C 实现的 JSON 编解码，比标准库快数倍
+except ImportError:
+    orjson = None
+
+try:
+    import ahocorasick  # 可选：pyahocorasick，多关键词单次线性扫描
+except ImportError:
+    ahocorasick = None
+
 logger = logging.getLogger(__name__)
 
+# 习惯关键词：(习惯类型, 关键词)
+_HABIT_WORDS = tuple(
+    [("action", w) for w in ("下载", "整理", "删除", "重命名", "移动", "复制", "总结", "搜索")]
+    + [("time_preference", w) for w in ("每天", "每周", "定时", "提醒")]
+)
+
+
+def _build_habit_automaton() -> Optional[Any]:
+    """构建习惯关键词自动机（未安装 pyahocorasick 时返回 None）"""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for _, word in _HABIT_WORDS:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+
+_HABIT_AC = _build_habit_automaton()
+
+# 无 pyahocorasick 时的回退：单个预编译交替正则，一次 C 层扫描
+# （关键词之间互不包含、首尾也不重叠，非重叠匹配得到的词集合与逐词 in 判断一致）
+_HABIT_RE = re.compile("|".join(re.escape(word) for _, word in _HABIT_WORDS))
+
+
+def _json_bytes(obj: Any) -> bytes:
+    """序列化为紧凑的 UTF-8 JSON（优先 orjson，不支持的类型回退到标准 json）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _ext_of(path: str) -> str:
+    """返回小写扩展名（语义同 Path(path).suffix.lower()，但不构造 Path 对象）"""
+    path = path.rstrip("/\\")
+    start = max(path.rfind("/"), path.rfind("\\")) + 1
+    i = path.rfind(".", start)
+    if i <= start or i == len(path) - 1:
+        return ""
+    return path[i:].lower()
+
+
+# ========== 知识提取（按步骤类型分派） ==========
+
+_Triple = Tuple[str, str, str]
+
+
+def _knowledge_from_file_create(params: Dict) -> Optional[_Triple]:
+    path = params.get("path", "")
+    return ("用户", "创建", path) if path else None
+
+
+def _knowledge_from_file_rename(params: Dict) -> Optional[_Triple]:
+    old = params.get("old_name", "")
+    new = params.get("new_name", "")
+    return (old, "重命名为", new) if old and new else None
+
+
+def _knowledge_from_browser_navigate(params: Dict) -> Optional[_Triple]:
+    url = params.get("url", "")
+    return ("用户", "访问", url) if url else None
+
+
+def _knowledge_from_download_file(params: Dict) -> Optional[_Triple]:
+    url = params.get("url", "")
+    path = params.get("save_path", "")
+    return (url, "下载到", path) if url and path else None
+
+
+# 步骤类型 -> 知识提取函数
+_KNOWLEDGE_EXTRACTORS: Dict[str, Callable[[Dict], Optional[_Triple]]] = {
+    "file_save": _knowledge_from_file_create,
+    "file_create": _knowledge_from_file_create,
+    "file_rename": _knowledge_from_file_rename,
+    "browser_navigate": _knowledge_from_browser_navigate,
+    "download_file": _knowledge_from_download_file,
+}
+
 
 class MemoryManager:
     """
@@ -42,12 +138,20 @@ class MemoryManager:
         memory.get_preference("download_path")
     """
     
-    def __init__(self, db_path: Optional[Path] = None):
+    STATS_TTL = 5.0  # 统计缓存有效期（秒）
+    MAINTENANCE_INTERVAL = 3600  # 维护任务间隔（秒）
+    
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        vector_index_params: Optional[Dict[str, Any]] = None
+    ):
         """
         初始化记忆管理器
         
         Args:
             db_path: 数据库目录，默认 ~/.deskjarvis/
+            vector_index_params: 向量索引参数，透传给 VectorMemory
         """
         if db_path is None:
             db_path = Path.home() / ".deskjarvis"
@@ -57,18 +161,41 @@ class MemoryManager:
         
         # 初始化三层记忆
         self.structured = StructuredMemory(db_path / "memory.db")
-        self.vector = VectorMemory(db_path / "vector_memory")
+        self.vector = VectorMemory(db_path / "vector_memory", index_params=vector_index_params)
         self.advanced = AdvancedMemory()
         
         # 当前会话 ID
         self.session_id = str(uuid.uuid4())[:8]
         
+        # 统计缓存（短 TTL，写路径上失效）
+        self._stats_cache: Optional[Dict] = None
+        self._stats_cache_ts = 0.0
+        self._stats_cache_version: Optional[Tuple[int, int]] = None  # 生成缓存时的 (写入版本号, 失效计数)
+        self._stats_generation = 0  # 每次失效递增：查询期间发生失效时不写回缓存
+        self._stats_lock = threading.Lock()
+        
+        # 后台维护：有写入（dirty）才执行，可被提前唤醒或停止
+        self._dirty = True  # 启动后的第一轮总是执行一次
+        self._maintenance_wake = threading.Event()
+        self._maintenance_stop = threading.Event()
+        
+        # 习惯计数缓冲：任务内内存累加，任务结束时批量写入（失败时留在缓冲，维护任务/关闭时重试）
+        self._habit_buffer: Counter = Counter()
+        self._habit_lock = threading.Lock()
+        
+        # 上下文并发获取（SQLite 读取与向量检索互不依赖）
+        self._context_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="Memory-Context")
+        
         # 加载高级记忆状态
         self._load_advanced_state()
         
         # 启动后台维护任务
         self._start_maintenance_thread()
         
+        # 后台预热向量记忆（模型与索引），首个请求无需等待冷启动
+        if self.vector.enabled:
+            threading.Thread(target=self.vector.warmup, name="VectorWarmup", daemon=True).start()
+        
         logger.info(f"记忆管理器已初始化，会话 ID: {self.session_id}")
     
     # ========== 核心 API ==========
@@ -92,20 +219,34 @@ class MemoryManager:
         """
         context_parts = []
         
-        # 1. 分析用户情绪
+        # 结构化记忆与向量记忆相互独立，提交到线程池并发获取
+        structured_future = self._context_pool.submit(
+            self.structured.get_memory_context, limit_per_category=3
+        )
+        vector_future = None
+        if include_vector and self.vector.enabled:
+            vector_future = self._context_pool.submit(
+                self.vector.get_memory_context, instruction, limit=3
+            )
+        
+        # 1. 分析用户情绪（会写入情绪历史，留在当前线程执行）
         emotion_result = self.advanced.analyze_emotion(instruction)
         if emotion_result["emotion"] != "neutral":
             context_parts.append(f"[用户情绪: {emotion_result['emotion']}] {emotion_result['suggestion']}")
         
+        # 高级记忆为纯内存计算，在等待上述结果期间完成
+        advanced_context = self.advanced.get_memory_context()
+        workflow_suggestion = self.advanced.get_workflow_suggestion(instruction)
+        
         # 2. 结构化记忆上下文
-        structured_context = self.structured.get_memory_context(limit_per_category=3)
+        structured_context = structured_future.result()
         if structured_context:
             context_parts.append(structured_context)
         
         # 3. 向量记忆上下文（语义搜索）
-        if include_vector and self.vector.enabled:
+        if vector_future is not None:
             try:
-                vector_context = self.vector.get_memory_context(instruction, limit=3)
+                vector_context = vector_future.result()
                 if vector_context:
                     context_parts.append(vector_context)
             except Exception as e:
@@ -113,24 +254,27 @@ class MemoryManager:
                 logger.warning(f"获取向量记忆上下文失败，将跳过向量记忆: {e}")
         
         # 4. 高级记忆上下文
-        advanced_context = self.advanced.get_memory_context()
         if advanced_context:
             context_parts.append(advanced_context)
         
         # 5. 工作流建议
-        workflow_suggestion = self.advanced.get_workflow_suggestion(instruction)
         if workflow_suggestion:
             context_parts.append(f"**工作流提示**：{workflow_suggestion['message']}")
         
-        # 合并并截断
-        full_context = "\n\n".join(context_parts)
-        
-        # 简单截断（按字符数）
-        max_chars = max_tokens * 2
-        if len(full_context) > max_chars:
-            full_context = full_context[:max_chars] + "\n...(记忆已截断)"
-        
-        return full_context
+        # 按字符预算逐段拼接，超出预算时只截取剩余部分，不先拼出完整字符串
+        remaining = max_tokens * 2
+        pieces = []
+        for i, part in enumerate(context_parts):
+            if i:
+                part = "\n\n" + part
+            if len(part) > remaining:
+                pieces.append(part[:remaining])
+                pieces.append("\n...(记忆已截断)")
+                break
+            pieces.append(part)
+            remaining -= len(part)
+        
+        return "".join(pieces)
     
     def save_task_result(
         self,
@@ -153,15 +297,37 @@ class MemoryManager:
             files_involved: 涉及的文件
         """
         try:
-            # 1. 保存到结构化记忆
-            self.structured.add_instruction(
-                instruction=instruction,
-                steps=steps,
-                success=success,
-                duration=duration
-            )
+            # 1. 结构化记忆写入合并为一个事务，只提交一次
+            with self.structured.transaction():
+                self.structured.add_instruction(
+                    instruction=instruction,
+                    steps=steps,
+                    success=success,
+                    duration=duration
+                )
+                
+                # 2. 提取并保存文件记录
+                if files_involved:
+                    operation = "create" if success else "failed"
+                    self.structured.add_file_records(
+                        [{"path": file_path, "operation": operation} for file_path in files_involved]
+                    )
+                
+                # 3. 提取知识三元组并记录习惯
+                self._ingest_steps(instruction, steps)
             
-            # 2. 保存到向量记忆
+            # 4. 本次任务的习惯计数一次性落库（读取立即可见，进程被杀也不丢失）
+            #    失败时计数留在缓冲等下次写入，不影响后续的动作与向量记忆写入
+            try:
+                self._flush_habits()
+            except Exception as e:
+                logger.warning(f"写入习惯计数失败，下次重试: {e}")
+
+            # 5. 记录动作到高级记忆
+            for step in steps:
+                self.advanced.record_action(step)
+            
+            # 6. 保存到向量记忆（放在事务外，避免嵌入计算期间占用写锁）
             response_text = result.get("message", "") or str(result)
             self.vector.add_conversation(
                 user_message=instruction,
@@ -178,22 +344,7 @@ class MemoryManager:
                 files_involved=files_involved
             )
             
-            # 3. 记录动作到高级记忆
-            for step in steps:
-                self.advanced.record_action(step)
-            
-            # 4. 提取并保存文件记录
-            if files_involved:
-                for file_path in files_involved:
-                    operation = "create" if success else "failed"
-                    self.structured.add_file_record(file_path, operation=operation)
-            
-            # 5. 提取知识三元组
-            self._extract_and_save_knowledge(instruction, steps, result)
-            
-            # 6. 记录习惯
-            self._record_habits(instruction, steps)
-            
+            self._mark_dirty()
             logger.debug(f"任务结果已保存到记忆: {instruction[:50]}...")
             
         except Exception as e:
@@ -201,7 +352,7 @@ class MemoryManager:
     
     def save_session_summary(self, summary: str, key_actions: Optional[List[str]] = None):
         """保存会话摘要"""
-        files = [f["path"] for f in self.structured.get_recent_files(limit=10)]
+        files = self.structured.get_recent_file_paths(limit=10)
         emotion_pattern = self.advanced.get_emotion_pattern()
         
         self.structured.save_session(
@@ -223,6 +374,7 @@ class MemoryManager:
     ):
         """设置用户偏好"""
         self.structured.set_preference(key, value, category, confirmed=confirmed)
+        self._mark_dirty()
     
     def get_preference(self, key: str, default: Any = None) -> Any:
         """获取用户偏好"""
@@ -243,6 +395,7 @@ class MemoryManager:
     def add_file_record(self, path: str, operation: str = "access", tags: Optional[List[str]] = None):
         """添加文件记录"""
         self.structured.add_file_record(path, operation=operation, tags=tags)
+        self._mark_dirty()
     
     def get_recent_files(self, limit: int = 10, file_type: Optional[str] = None) -> List[Dict]:
         """获取最近文件"""
@@ -257,6 +410,7 @@ class MemoryManager:
     def add_knowledge(self, subject: str, predicate: str, obj: str, **kwargs):
         """添加知识"""
         self.structured.add_knowledge(subject, predicate, obj, **kwargs)
+        self._mark_dirty()
     
     def query_knowledge(self, **kwargs) -> List[Dict]:
         """查询知识"""
@@ -280,25 +434,35 @@ class MemoryManager:
     # ========== 工作流发现 ==========
     
     def discover_workflows(self) -> List[Dict]:
-        """发现工作流模式"""
-        # 从结构化记忆获取指令历史
+        """发现工作流模式（自上次发现以来没有新指令时直接复用结果）"""
+        last_id = int(self.structured.get_meta("workflow_discovery_last_id", "0"))
+        
+        # 从结构化记忆获取指令历史（先等后台写线程写完排队的指令）
+        self.structured._wait_for_writes()
         with self.structured._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
+            latest_id = conn.execute("SELECT MAX(id) FROM instruction_history").fetchone()[0] or 0
+            if latest_id == last_id and self.advanced.discovered_patterns:
+                return self.advanced.discovered_patterns
+            
+            # 模式按整个窗口聚合出现次数，因此仍需读取最近 500 条而非仅增量部分
+            cursor = conn.execute("""
                 SELECT instruction, steps, success, created_at 
                 FROM instruction_history 
                 ORDER BY created_at DESC LIMIT 500
             """)
-            history = []
-            for row in cursor.fetchall():
-                history.append({
+            history = [
+                {
                     "instruction": row["instruction"],
                     "steps": row["steps"],
                     "success": bool(row["success"]),
                     "timestamp": row["created_at"]
-                })
+                }
+                for row in cursor
+            ]
         
-        return self.advanced.discover_workflows(history)
+        patterns = self.advanced.discover_workflows(history)
+        self.structured.set_meta("workflow_discovery_last_id", latest_id)
+        return patterns
     
     def get_workflow_suggestion(self, instruction: str) -> Optional[Dict]:
         """获取工作流建议"""
@@ -329,18 +493,15 @@ class MemoryManager:
             
             if response == "是":
                 # 保存为确认的偏好
-                # 需要从 pending 中找到对应的偏好
-                pending = self.get_pending_confirmations()
-                for p in pending:
-                    if p["id"] == confirmation_id:
-                        pref = p["preference"]
-                        self.set_preference(
-                            f"auto_{pref['type']}", 
-                            pref["value"],
-                            category="auto_discovered",
-                            confirmed=True
-                        )
-                        break
+                p = self.advanced.get_pending_confirmation_by_id(confirmation_id)
+                if p:
+                    pref = p["preference"]
+                    self.set_preference(
+                        f"auto_{pref['type']}", 
+                        pref["value"],
+                        category="auto_discovered",
+                        confirmed=True
+                    )
             elif response == "以后不再询问":
                 # 标记为不再询问
                 self.set_preference(
@@ -351,66 +512,66 @@ class MemoryManager:
     
     # ========== 内部方法 ==========
     
-    def _extract_and_save_knowledge(self, instruction: str, steps: List[Dict], result: Dict):
-        """提取并保存知识三元组"""
-        # 简单的知识提取
+    def _ingest_steps(self, instruction: str, steps: List[Dict]):
+        """
+        单次遍历步骤：提取知识三元组并检测文件类型习惯
+        
+        知识一次批量写入；习惯累加到内存缓冲，由 save_task_result 在任务结束时经 _flush_habits 批量落库。
+        """
+        # 检测常用动词和时间相关词（自动机或正则单次扫描指令）
+        if _HABIT_AC is not None:
+            contains = {w for _, w in _HABIT_AC.iter(instruction)}.__contains__
+        else:
+            contains = set(_HABIT_RE.findall(instruction)).__contains__
+        
+        habits = [(kind, word) for kind, word in _HABIT_WORDS if contains(word)]
+        triples = []
+        
         for step in steps:
-            step_type = step.get("type", "")
             params = step.get("params", {})
             
-            if step_type == "file_save" or step_type == "file_create":
-                path = params.get("path", "")
-                if path:
-                    self.add_knowledge("用户", "创建", path)
-            
-            elif step_type == "file_rename":
-                old = params.get("old_name", "")
-                new = params.get("new_name", "")
-                if old and new:
-                    self.add_knowledge(old, "重命名为", new)
+            # 知识三元组（按步骤类型查表提取）
+            extractor = _KNOWLEDGE_EXTRACTORS.get(step.get("type", ""))
+            if extractor is not None:
+                triple = extractor(params)
+                if triple:
+                    triples.append(triple)
             
-            elif step_type == "browser_navigate":
-                url = params.get("url", "")
-                if url:
-                    self.add_knowledge("用户", "访问", url)
-            
-            elif step_type == "download_file":
-                url = params.get("url", "")
-                path = params.get("save_path", "")
-                if url and path:
-                    self.add_knowledge(url, "下载到", path)
-    
-    def _record_habits(self, instruction: str, steps: List[Dict]):
-        """记录习惯模式"""
-        # 记录指令模式
-        # 检测常用动词
-        action_words = ["下载", "整理", "删除", "重命名", "移动", "复制", "总结", "搜索"]
-        for word in action_words:
-            if word in instruction:
-                self.structured.record_habit("action", word)
-        
-        # 检测时间相关词
-        time_words = ["每天", "每周", "定时", "提醒"]
-        for word in time_words:
-            if word in instruction:
-                self.structured.record_habit("time_preference", word)
-        
-        # 检测文件类型偏好
-        for step in steps:
-            params = step.get("params", {})
+            # 文件类型偏好
             path = params.get("path", "") or params.get("file_path", "")
             if path:
-                ext = Path(path).suffix.lower()
+                ext = _ext_of(path)
                 if ext:
-                    self.structured.record_habit("file_type", ext)
+                    habits.append(("file_type", ext))
+        
+        if triples:
+            self.structured.add_knowledge_many(triples)
+        if habits:
+            with self._habit_lock:
+                self._habit_buffer.update(habits)
+    
+    def _flush_habits(self):
+        """将缓冲的习惯计数一次性写入结构化记忆"""
+        with self._habit_lock:
+            if not self._habit_buffer:
+                return
+            counts, self._habit_buffer = self._habit_buffer, Counter()
+        try:
+            self.structured.record_habits(counts)
+        except Exception:
+            # 写入失败时放回缓冲，下次再试
+            with self._habit_lock:
+                self._habit_buffer.update(counts)
+            raise
+        self._invalidate_stats()
     
     def _load_advanced_state(self):
         """加载高级记忆状态"""
         state_file = self.db_path / "advanced_state.json"
         if state_file.exists():
             try:
-                with open(state_file, "r", encoding="utf-8") as f:
-                    state = json.load(f)
+                data = state_file.read_bytes()
+                state = orjson.loads(data) if orjson is not None else json.loads(data)
                 self.advanced.import_state(state)
                 logger.info("已加载高级记忆状态")
             except Exception as e:
@@ -420,9 +581,12 @@ class MemoryManager:
         """保存高级记忆状态"""
         state_file = self.db_path / "advanced_state.json"
         try:
-            state = self.advanced.export_state()
-            with open(state_file, "w", encoding="utf-8") as f:
-                json.dump(state, f, ensure_ascii=False, indent=2)
+            data = _json_bytes(self.advanced.export_state())
+            
+            # 先写临时文件再原子替换，避免写到一半崩溃导致状态文件损坏
+            tmp_file = state_file.with_suffix(".json.tmp")
+            tmp_file.write_bytes(data)
+            os.replace(tmp_file, state_file)
             logger.debug("已保存高级记忆状态")
         except Exception as e:
             logger.warning(f"保存高级记忆状态失败: {e}")
@@ -430,9 +594,16 @@ class MemoryManager:
     def _start_maintenance_thread(self):
         """启动后台维护线程"""
         def maintenance_loop():
-            while True:
+            while not self._maintenance_stop.is_set():
+                self._maintenance_wake.wait(timeout=self.MAINTENANCE_INTERVAL)
+                self._maintenance_wake.clear()
+                if self._maintenance_stop.is_set():
+                    break
+                if not self._dirty:
+                    continue  # 自上次维护以来没有写入，跳过
+                # 先清标记：维护期间的新写入会在下一轮处理
+                self._dirty = False
                 try:
-                    time.sleep(3600)  # 每小时执行一次
                     self._run_maintenance()
                 except Exception as e:
                     logger.error(f"维护任务失败: {e}")
@@ -441,10 +612,29 @@ class MemoryManager:
         thread.start()
         logger.debug("后台维护线程已启动")
     
+    def _mark_dirty(self):
+        """写入后调用：使统计缓存失效，并标记需要维护"""
+        self._invalidate_stats()
+        self._dirty = True
+    
+    def _invalidate_stats(self):
+        """使统计缓存失效"""
+        with self._stats_lock:
+            self._stats_cache = None
+            self._stats_generation += 1
+    
+    def request_maintenance(self):
+        """立即唤醒后台维护线程执行一次维护"""
+        self._dirty = True
+        self._maintenance_wake.set()
+    
     def _run_maintenance(self):
         """执行维护任务"""
         logger.info("开始执行记忆维护...")
         
+        # 0. 写入缓冲的习惯计数
+        self._flush_habits()
+        
         # 1. 压缩旧的向量记忆
         if self.vector.enabled:
             self.vector.compress_memories(time_window="week")
@@ -462,33 +652,49 @@ class MemoryManager:
         if self.vector.enabled:
             self.vector.persist()
         
+        # 维护会压缩、清理数据，统计需重新计算
+        self._invalidate_stats()
         logger.info("记忆维护完成")
     
     # ========== 统计 & 诊断 ==========
     
     def get_stats(self) -> Dict:
-        """获取记忆系统统计"""
+        """获取记忆系统统计（短时间内重复调用直接返回缓存；返回副本，调用方可随意修改）"""
+        # 先等后台写线程写完排队的记录，计数才包含刚完成的任务
+        self.structured.flush()
+        now = time.monotonic()
+        with self._stats_lock:
+            # 后台写线程每批写入都会递增写入版本号，版本变化即说明计数已过期
+            version = (self.structured._ctx_version, self._stats_generation)
+            if (
+                self._stats_cache is not None
+                and version == self._stats_cache_version
+                and now - self._stats_cache_ts < self.STATS_TTL
+            ):
+                return copy.deepcopy(self._stats_cache)
+        
         with self.structured._get_connection() as conn:
             cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*) FROM preferences")
-            prefs_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM recent_files")
-            files_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM knowledge_graph")
-            knowledge_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM instruction_history")
-            instructions_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM habits")
-            habits_count = cursor.fetchone()[0]
+            # 单条语句一次性取回五个计数，避免多次语句准备与往返
+            cursor.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM preferences),
+                    (SELECT COUNT(*) FROM recent_files),
+                    (SELECT COUNT(*) FROM knowledge_graph),
+                    (SELECT COUNT(*) FROM instruction_history),
+                    (SELECT COUNT(*) FROM habits)
+            """)
+            (
+                prefs_count,
+                files_count,
+                knowledge_count,
+                instructions_count,
+                habits_count,
+            ) = cursor.fetchone()
         
         vector_stats = self.vector.get_stats() if self.vector.enabled else {}
         
-        return {
+        stats = {
             "session_id": self.session_id,
             "structured_memory": {
                 "preferences": prefs_count,
@@ -504,22 +710,73 @@ class MemoryManager:
                 "workflows_discovered": len(self.advanced.discovered_patterns)
             }
         }
-    
-    def export_all_memories(self) -> Dict:
-        """导出所有记忆（用于备份）"""
-        return {
-            "preferences": self.get_all_preferences(),
-            "recent_files": self.get_recent_files(limit=100),
-            "knowledge": self.query_knowledge(limit=1000),
-            "habits": self.structured.get_habits(),
-            "advanced_state": self.advanced.export_state(),
-            "exported_at": datetime.now().isoformat()
-        }
+        with self._stats_lock:
+            # 查询期间缓存被失效过（版本已变化）时不写回，避免存入过期结果
+            if version == (self.structured._ctx_version, self._stats_generation):
+                self._stats_cache = stats
+                self._stats_cache_ts = now
+                self._stats_cache_version = version
+        return copy.deepcopy(stats)
+    
+    def export_all_memories(self, path: Optional[Path] = None) -> Any:
+        """
+        导出所有记忆（用于备份）
+        
+        Args:
+            path: 导出文件路径。提供时逐段流式写入 JSON 文件并返回该路径，
+                  知识图谱按行写出，不在内存中构造完整结果；
+                  不提供时返回字典（兼容旧用法）
+        """
+        if path is None:
+            return {
+                "preferences": self.get_all_preferences(),
+                "recent_files": self.get_recent_files(limit=100),
+                "knowledge": self.query_knowledge(limit=1000),
+                "habits": self.structured.get_habits(),
+                "advanced_state": self.advanced.export_state(),
+                "exported_at": datetime.now().isoformat()
+            }
+        
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(b'{"preferences":' + _json_bytes(self.get_all_preferences()))
+            f.write(b',"recent_files":' + _json_bytes(self.get_recent_files(limit=100)))
+            
+            # 知识图谱：逐行写出
+            f.write(b',"knowledge":[')
+            with self.structured._get_connection() as conn:
+                cursor = conn.execute("""
+                    SELECT * FROM knowledge_graph 
+                    ORDER BY importance DESC, created_at DESC 
+                    LIMIT 1000
+                """)
+                for i, row in enumerate(cursor):
+                    if i:
+                        f.write(b",")
+                    f.write(_json_bytes(dict(row)))
+            f.write(b"]")
+            
+            f.write(b',"habits":' + _json_bytes(self.structured.get_habits()))
+            f.write(b',"advanced_state":' + _json_bytes(self.advanced.export_state()))
+            f.write(b',"exported_at":' + _json_bytes(datetime.now().isoformat()) + b"}")
+        os.replace(tmp_path, path)
+        logger.info(f"记忆已导出: {path}")
+        return path
     
     def shutdown(self):
         """关闭记忆管理器（保存状态）"""
         logger.info("正在关闭记忆管理器...")
+        self._maintenance_stop.set()
+        self._maintenance_wake.set()
+        try:
+            self._flush_habits()
+        except Exception as e:
+            logger.warning(f"写入习惯计数失败: {e}")
         self._save_advanced_state()
         if self.vector.enabled:
             self.vector.persist()
+        self._context_pool.shutdown(wait=False)
+        self.vector.close()
+        self.structured.close()
         logger.info("记忆管理器已关闭")
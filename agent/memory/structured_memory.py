@@ -12,17 +12,190 @@
 import sqlite3
 import json
 import logging
-from datetime import datetime, timedelta
+import os
+import queue
+import re
+import threading
+import time
+from itertools import combinations
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from contextlib import contextmanager
 
+try:
+    import orjson  # 可选：C 实现的 JSON 编解码，比标准库快数倍
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# 每个连接都需要设置的 PRAGMA（journal_mode=WAL 会持久化到库文件，只需设置一次）
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",    # WAL 下只在检查点 fsync，单条提交不再等待刷盘
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",   # 256 MiB 内存映射读取，跳过 read() 拷贝
+    "PRAGMA cache_size=-65536",     # 64 MiB 页缓存
+)
+
+# FTS5 全文索引镜像：{源表: 被索引的列}
+# 使用 trigram 分词，支持任意位置的子串匹配（与 LIKE '%kw%' 语义一致，中文路径同样适用）
+_FTS_TABLES = {
+    "recent_files": ("path", "tags"),
+    "instruction_history": ("normalized",),
+    "knowledge_graph": ("subject", "predicate", "object"),
+}
+
+# trigram 索引无法匹配短于 3 个字符的查询，此时回退到 LIKE
+_FTS_MIN_QUERY_LEN = 3
+
+# 指令标准化：数字/路径分隔符等替换为空格，再折叠连续空白
+_RE_NONWORD = re.compile(r'[0-9\.\-\_\/\\]')
+_RE_WS = re.compile(r'\s+')
+
+# 空列表/空字典的 JSON 文本，写入默认值时直接复用，不经过编码器
+_EMPTY_LIST_JSON = "[]"
+_EMPTY_DICT_JSON = "{}"
+
+# 扩展名 -> 文件类型（_guess_file_type 每条文件记录都会查询）
+_FILE_TYPE_MAP = {
+    ".pdf": "document",
+    ".doc": "document", ".docx": "document",
+    ".xls": "spreadsheet", ".xlsx": "spreadsheet",
+    ".ppt": "presentation", ".pptx": "presentation",
+    ".jpg": "image", ".jpeg": "image", ".png": "image", ".gif": "image",
+    ".mp4": "video", ".avi": "video", ".mov": "video",
+    ".mp3": "audio", ".wav": "audio",
+    ".py": "code", ".js": "code", ".ts": "code", ".java": "code",
+    ".zip": "archive", ".rar": "archive", ".7z": "archive",
+}
+
+# 各表返回给调用方的列（显式列出，读取时按元组组装字典，不经过 sqlite3.Row）
+_RECENT_FILE_COLUMNS = ("id", "path", "file_type", "operation", "tags", "metadata", "created_at")
+_SESSION_COLUMNS = (
+    "id", "session_id", "summary", "key_actions", "files_involved", "emotion", "created_at", "updated_at",
+)
+_KNOWLEDGE_COLUMNS = (
+    "id", "subject", "predicate", "object", "target", "context", "confidence", "importance", "created_at",
+)
+_HABIT_COLUMNS = ("id", "pattern_type", "pattern_value", "frequency", "last_seen", "metadata")
+_INSTRUCTION_COLUMNS = ("id", "instruction", "normalized", "steps", "success", "duration_seconds", "created_at")
+
+# 后台写线程负责的表及其插入语句
+_QUEUED_INSERTS = {
+    "recent_files": """
+        INSERT INTO recent_files (path, file_type, operation, tags, metadata)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+    "instruction_history": """
+        INSERT INTO instruction_history 
+        (instruction, normalized, steps, success, duration_seconds)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+}
+
+# 后台写线程单个事务最多合并的写入请求数
+_WRITE_BATCH_SIZE = 256
+# 批量写入失败（如数据库被锁）时的重试次数与首次重试间隔（秒，之后翻倍）
+_WRITE_RETRIES = 3
+_WRITE_RETRY_DELAY = 0.1
+
+
+def _select_list(columns: Tuple[str, ...], alias: str = "") -> str:
+    """生成 SELECT 列清单，可带表别名前缀"""
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + column for column in columns)
+
+
+# query_knowledge 的固定语句：未提供的条件以 NULL 传入并在运行时短路，
+# 语句文本不随参数组合变化，可命中连接的预编译语句缓存
+_KNOWLEDGE_FILTERS = """
+    (? IS NULL OR k.subject LIKE ?)
+    AND (? IS NULL OR k.predicate LIKE ?)
+    AND (? IS NULL OR k.object LIKE ?)
+"""
+_KNOWLEDGE_QUERY_SQL = f"""
+    SELECT {_select_list(_KNOWLEDGE_COLUMNS, "k")} FROM knowledge_graph k
+    WHERE {_KNOWLEDGE_FILTERS}
+    ORDER BY k.importance DESC, k.created_at DESC 
+    LIMIT ?
+"""
+_KNOWLEDGE_FTS_QUERY_SQL = f"""
+    SELECT {_select_list(_KNOWLEDGE_COLUMNS, "k")} FROM knowledge_graph k
+    JOIN knowledge_graph_fts f ON f.rowid = k.id
+    WHERE knowledge_graph_fts MATCH ? AND {_KNOWLEDGE_FILTERS}
+    ORDER BY k.importance DESC, k.created_at DESC 
+    LIMIT ?
+"""
+
+# 精确匹配：按提供的列组合预生成等值查询（可直接走 idx_kg_subject/predicate/object 索引）
+_KNOWLEDGE_EXACT_QUERY_SQL = {
+    columns: f"""
+    SELECT {_select_list(_KNOWLEDGE_COLUMNS, "k")} FROM knowledge_graph k
+    WHERE {" AND ".join(f"k.{column} = ?" for column in columns)}
+    ORDER BY k.importance DESC, k.created_at DESC 
+    LIMIT ?
+"""
+    for size in (1, 2, 3)
+    for columns in combinations(("subject", "predicate", "object"), size)
+}
+
+
+def _tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """返回按元组取行的游标（连接默认的 sqlite3.Row 需要按列名包装每一行）"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def _fetch_dicts(conn: sqlite3.Connection, sql: str, params, columns: Tuple[str, ...]) -> List[Dict]:
+    """执行查询，并用预置列名把元组行组装成字典"""
+    rows = _tuple_cursor(conn).execute(sql, params).fetchall()
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _json_dumps(value: Any) -> str:
+    """序列化为 JSON 文本（优先 orjson，不支持的类型回退到标准 json）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _json_loads(raw: str) -> Any:
+    """解析 JSON 文本（orjson.JSONDecodeError 是 json.JSONDecodeError 的子类）"""
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _json_text(value: Any, empty: str) -> str:
+    """编码 JSON 字段；None/空容器直接返回预置的空值文本"""
+    return empty if not value else _json_dumps(value)
+
+
+def _decode_value(raw: str) -> Any:
+    """解码偏好值（写入时非字符串值做了 JSON 编码，纯字符串原样存储）"""
+    try:
+        return _json_loads(raw)
+    except json.JSONDecodeError:
+        return raw
+
+
+def _fts_phrase(text: str) -> str:
+    """将文本转为 FTS5 短语查询（双引号包裹，内部引号转义）"""
+    return '"' + text.replace('"', '""') + '"'
+
 
 class StructuredMemory:
     """结构化记忆 - SQLite 存储"""
     
+    # 本进程内已切换为 WAL 的数据库文件（journal_mode 持久化在库文件中，每个库只需设置一次）
+    _wal_applied_paths: set = set()
+    _wal_lock = threading.Lock()
+    
+    # get_memory_context 缓存有效期（秒）：本实例的写入会立即失效缓存，TTL 兜底其他进程的写入
+    CONTEXT_CACHE_TTL = 30.0
+    
     def __init__(self, db_path: Optional[Path] = None):
         """
         初始化结构化记忆
@@ -36,22 +209,214 @@ class StructuredMemory:
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
+        # 每个线程一个长连接（首次使用时创建），close() 时统一关闭
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        
+        # SQLite 未编译 FTS5 时回退到 LIKE 扫描
+        self._fts_enabled = False
+        
+        # 记忆上下文缓存：{limit_per_category: (写入版本号, 生成时间, 文本)}
+        self._ctx_cache: Dict[int, Tuple[int, float, str]] = {}
+        self._ctx_version = 0
+        
+        # 文件记录/指令历史的后台写线程（首次写入时启动），调用方无需等待提交
+        self._write_q: "queue.Queue[Optional[Tuple[str, List[tuple]]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._write_error: Optional[Exception] = None  # 重试后仍失败的写入错误，由 flush() 抛出
+        
+        self._apply_pragmas()
         self._init_database()
         logger.info(f"结构化记忆已初始化: {self.db_path}")
     
+    def _thread_connection(self) -> sqlite3.Connection:
+        """获取当前线程的长连接（首次调用时创建并应用连接级 PRAGMA）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None：由 _get_connection / transaction 显式 BEGIN/COMMIT
+            conn = sqlite3.connect(
+                str(self.db_path),
+                check_same_thread=False,
+                isolation_level=None,
+                cached_statements=256,  # 预编译语句缓存，热点 SQL 不重复解析
+            )
+            conn.row_factory = sqlite3.Row
+            for pragma in _CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """写完排队中的记录，停止后台写线程，并关闭所有线程的长连接"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._write_q.put(None)
+            writer.join()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.debug(f"关闭数据库连接失败: {e}")
+        self._local = threading.local()
+    
+    def _apply_pragmas(self):
+        """设置增量 auto_vacuum 并切换到 WAL 日志模式（持久化设置，每个进程每个库只执行一次）"""
+        key = str(self.db_path.resolve())
+        with self._wal_lock:
+            if key in self._wal_applied_paths:
+                return
+            conn = sqlite3.connect(str(self.db_path))
+            try:
+                # 只对尚未建表的新库生效；旧库在 cleanup_old_data 中通过一次 VACUUM 转换
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            finally:
+                conn.close()
+            if mode == "wal":
+                self._wal_applied_paths.add(key)
+            else:
+                logger.warning(f"无法切换到 WAL 模式，当前日志模式: {mode}")
+    
     @contextmanager
     def _get_connection(self):
-        """获取数据库连接（上下文管理器）"""
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
+        """获取数据库连接（上下文管理器，复用当前线程的长连接）"""
+        conn = self._thread_connection()
+        if conn.in_transaction:
+            # 已处于事务中（transaction() 或外层调用）：直接复用，由外层统一提交
+            yield conn
+            return
+        
+        conn.execute("BEGIN")
         try:
             yield conn
-            conn.commit()
+            conn.execute("COMMIT")
         except Exception as e:
-            conn.rollback()
+            if conn.in_transaction:  # 部分错误下 SQLite 已自动回滚
+                conn.execute("ROLLBACK")
             raise e
-        finally:
-            conn.close()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        显式事务（上下文管理器）
+        
+        块内所有写操作共用当前线程的连接，在退出时一次性提交（单次 fsync），
+        异常时整体回滚。可嵌套，内层直接复用外层事务。
+        """
+        conn = self._thread_connection()
+        if conn.in_transaction:
+            yield
+            return
+        
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            conn.execute("COMMIT")
+            # 块内写入在提交后才对其他线程可见，提交后再失效一次，避免其间读到的旧结果被缓存
+            self._invalidate_context_cache()
+        except Exception as e:
+            if conn.in_transaction:  # 部分错误下 SQLite 已自动回滚
+                conn.execute("ROLLBACK")
+            raise e
+    
+    def _queue_rows(self, table: str, rows: List[tuple]):
+        """
+        提交待插入的行
+        
+        处于事务中时（如 transaction() 块内）同步写入，保证与块内其他写操作一起提交或回滚；
+        否则交给后台写线程合并提交。
+        """
+        if self._thread_connection().in_transaction:
+            with self._get_connection() as conn:
+                conn.executemany(_QUEUED_INSERTS[table], rows)
+            self._invalidate_context_cache()
+            return
+        
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._writer_loop, name="StructuredMemoryWriter", daemon=True
+                )
+                self._writer.start()
+        self._write_q.put((table, rows))
+    
+    def _writer_loop(self):
+        """后台写线程：取出排队的写入，按表分组后在一个事务内 executemany"""
+        while True:
+            items = [self._write_q.get()]
+            while len(items) < _WRITE_BATCH_SIZE:
+                try:
+                    items.append(self._write_q.get_nowait())
+                except queue.Empty:
+                    break
+            
+            stop = None in items
+            grouped: Dict[str, List[tuple]] = {}
+            for item in items:
+                if item is not None:
+                    grouped.setdefault(item[0], []).extend(item[1])
+            
+            try:
+                if grouped:
+                    self._write_grouped(grouped)
+            except Exception as e:
+                logger.error(f"后台写入重试 {_WRITE_RETRIES} 次后仍失败，丢弃 {sum(len(r) for r in grouped.values())} 行: {e}")
+                self._write_error = e
+            finally:
+                for _ in items:
+                    self._write_q.task_done()
+            
+            if stop:
+                return
+    
+    def _write_grouped(self, grouped: Dict[str, List[tuple]]):
+        """在一个事务内写入按表分组的行，失败时退避重试（事务整体回滚，重试不会重复插入）"""
+        delay = _WRITE_RETRY_DELAY
+        for attempt in range(_WRITE_RETRIES + 1):
+            try:
+                with self._get_connection() as conn:
+                    for table, rows in grouped.items():
+                        conn.executemany(_QUEUED_INSERTS[table], rows)
+                break
+            except sqlite3.Error as e:
+                if attempt == _WRITE_RETRIES:
+                    raise
+                logger.warning(f"后台写入失败，{delay:.1f}s 后重试: {e}")
+                time.sleep(delay)
+                delay *= 2
+        self._invalidate_context_cache()
+    
+    def _wait_for_writes(self):
+        """等待后台写线程写完已排队的记录（本类的读取方法调用，写入失败不影响读取）"""
+        if self._writer is None:
+            return
+        if self._thread_connection().in_transaction:
+            # 当前线程持有写事务时等待会与写线程互相阻塞，直接读取已提交的数据
+            return
+        self._write_q.join()
+    
+    def flush(self):
+        """
+        等待后台写线程写完已排队的记录（读取这些表前调用，保证读到自己的写入）
+        
+        Raises:
+            Exception: 此前有排队的记录在重试后仍写入失败（只抛出一次）
+        """
+        self._wait_for_writes()
+        error, self._write_error = self._write_error, None
+        if error is not None:
+            raise error
+    
+    def _invalidate_context_cache(self):
+        """使 get_memory_context 缓存失效（影响上下文内容的写入方法调用）"""
+        self._ctx_version += 1
     
     def _init_database(self):
         """初始化数据库表"""
@@ -85,6 +450,8 @@ class StructuredMemory:
             """)
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_recent_files_path ON recent_files(path)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_recent_files_time ON recent_files(created_at)")
+            # 按类型筛选的最近文件：索引内范围扫描即得有序结果，无需排序
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_recent_files_type_time ON recent_files(file_type, created_at DESC)")
             
             # 3. 会话摘要
             cursor.execute("""
@@ -117,6 +484,8 @@ class StructuredMemory:
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_kg_subject ON knowledge_graph(subject)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_kg_object ON knowledge_graph(object)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_kg_predicate ON knowledge_graph(predicate)")
+            # 无过滤条件的 query_knowledge / 导出按该顺序取前 N 条：索引顺序扫描，无需排序
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_kg_rank ON knowledge_graph(importance DESC, created_at DESC)")
             
             # 5. 习惯模式
             cursor.execute("""
@@ -130,6 +499,9 @@ class StructuredMemory:
                 )
             """)
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_habits_type ON habits(pattern_type)")
+            # 部分索引：只收录频率 >= 2 的习惯，get_memory_context 按频率倒序直接范围扫描
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_habits_freq_gt2 ON habits(frequency DESC) WHERE frequency >= 2")
+            self._ensure_habits_unique_key(cursor)
             
             # 6. 指令历史（用于工作流发现）
             cursor.execute("""
@@ -144,8 +516,84 @@ class StructuredMemory:
                 )
             """)
             
+            # 7. 内部元数据（维护任务的水位线等）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            
+            # 8. 全文索引
+            self._init_fts(cursor)
+            
             logger.info("数据库表已初始化")
     
+    def _ensure_habits_unique_key(self, cursor: sqlite3.Cursor):
+        """为 habits(pattern_type, pattern_value) 建唯一索引（UPSERT 依赖），旧库先合并重复行"""
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_habits_key'"
+        ).fetchone()
+        if exists:
+            return
+        # 旧版本先查后插，并发时可能产生重复行：频率合并到最早的一行，其余删除
+        cursor.execute("""
+            UPDATE habits SET frequency = (
+                SELECT SUM(h2.frequency) FROM habits h2
+                WHERE h2.pattern_type = habits.pattern_type AND h2.pattern_value = habits.pattern_value
+            )
+            WHERE id IN (
+                SELECT MIN(id) FROM habits GROUP BY pattern_type, pattern_value HAVING COUNT(*) > 1
+            )
+        """)
+        cursor.execute("""
+            DELETE FROM habits WHERE id NOT IN (
+                SELECT MIN(id) FROM habits GROUP BY pattern_type, pattern_value
+            )
+        """)
+        cursor.execute("CREATE UNIQUE INDEX idx_habits_key ON habits(pattern_type, pattern_value)")
+    
+    def _init_fts(self, cursor: sqlite3.Cursor):
+        """创建 FTS5 外部内容索引及同步触发器（已有数据时重建索引）"""
+        try:
+            for table, columns in _FTS_TABLES.items():
+                fts = f"{table}_fts"
+                cols = ", ".join(columns)
+                new_cols = ", ".join(f"new.{c}" for c in columns)
+                old_cols = ", ".join(f"old.{c}" for c in columns)
+                
+                existed = cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+                ).fetchone()
+                cursor.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                        {cols}, content='{table}', content_rowid='id', tokenize='trigram'
+                    )
+                """)
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+                        INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+                    END
+                """)
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+                        INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                    END
+                """)
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE ON {table} BEGIN
+                        INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                        INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+                    END
+                """)
+                if not existed:
+                    # 旧库升级：为已有数据建立索引
+                    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            self._fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite 不支持 FTS5 trigram，搜索将使用 LIKE 扫描: {e}")
+            self._fts_enabled = False
+    
     # ========== 偏好管理 ==========
     
     def set_preference(
@@ -158,9 +606,8 @@ class StructuredMemory:
     ):
         """设置用户偏好"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            value_str = json.dumps(value, ensure_ascii=False) if not isinstance(value, str) else value
-            cursor.execute("""
+            value_str = _json_dumps(value) if not isinstance(value, str) else value
+            conn.execute("""
                 INSERT INTO preferences (key, value, category, confidence, confirmed, updated_at)
                 VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ON CONFLICT(key) DO UPDATE SET 
@@ -170,37 +617,27 @@ class StructuredMemory:
                     confirmed = excluded.confirmed,
                     updated_at = CURRENT_TIMESTAMP
             """, (key, value_str, category, confidence, confirmed))
+        self._invalidate_context_cache()
         logger.debug(f"设置偏好: {key} = {value}")
     
     def get_preference(self, key: str, default: Any = None) -> Any:
         """获取用户偏好"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT value FROM preferences WHERE key = ?", (key,))
+            cursor = conn.execute("SELECT value FROM preferences WHERE key = ?", (key,))
             row = cursor.fetchone()
             if row:
-                try:
-                    return json.loads(row["value"])
-                except json.JSONDecodeError:
-                    return row["value"]
+                return _decode_value(row["value"])
             return default
     
     def get_all_preferences(self, category: Optional[str] = None) -> Dict[str, Any]:
         """获取所有偏好"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
             if category:
-                cursor.execute("SELECT key, value FROM preferences WHERE category = ?", (category,))
+                cursor = conn.execute("SELECT key, value FROM preferences WHERE category = ?", (category,))
             else:
-                cursor.execute("SELECT key, value FROM preferences")
+                cursor = conn.execute("SELECT key, value FROM preferences")
             
-            result = {}
-            for row in cursor.fetchall():
-                try:
-                    result[row["key"]] = json.loads(row["value"])
-                except json.JSONDecodeError:
-                    result[row["key"]] = row["value"]
-            return result
+            return {row["key"]: _decode_value(row["value"]) for row in cursor.fetchall()}
     
     # ========== 文件历史 ==========
     
@@ -213,64 +650,82 @@ class StructuredMemory:
         metadata: Optional[Dict] = None
     ):
         """添加文件记录"""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO recent_files (path, file_type, operation, tags, metadata)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                path,
-                file_type or self._guess_file_type(path),
-                operation,
-                json.dumps(tags or [], ensure_ascii=False),
-                json.dumps(metadata or {}, ensure_ascii=False)
-            ))
-        logger.debug(f"添加文件记录: {path} ({operation})")
+        self.add_file_records([{
+            "path": path,
+            "file_type": file_type,
+            "operation": operation,
+            "tags": tags,
+            "metadata": metadata,
+        }])
+    
+    def add_file_records(self, records: List[Dict]):
+        """
+        批量添加文件记录（单个事务内 executemany；事务外调用时由后台写线程提交）
+        
+        Args:
+            records: [{path, file_type?, operation?, tags?, metadata?}, ...]
+        """
+        if not records:
+            return
+        rows = [
+            (
+                r["path"],
+                r.get("file_type") or self._guess_file_type(r["path"]),
+                r.get("operation", "access"),
+                _json_text(r.get("tags"), _EMPTY_LIST_JSON),
+                _json_text(r.get("metadata"), _EMPTY_DICT_JSON)
+            )
+            for r in records
+        ]
+        self._queue_rows("recent_files", rows)
+        logger.debug(f"添加文件记录: {len(rows)} 条")
     
     def get_recent_files(self, limit: int = 10, file_type: Optional[str] = None) -> List[Dict]:
         """获取最近文件"""
+        self._wait_for_writes()
         with self._get_connection() as conn:
-            cursor = conn.cursor()
             if file_type:
-                cursor.execute("""
-                    SELECT * FROM recent_files 
+                return _fetch_dicts(conn, f"""
+                    SELECT {_select_list(_RECENT_FILE_COLUMNS)} FROM recent_files 
                     WHERE file_type = ?
                     ORDER BY created_at DESC LIMIT ?
-                """, (file_type, limit))
-            else:
-                cursor.execute("""
-                    SELECT * FROM recent_files 
-                    ORDER BY created_at DESC LIMIT ?
-                """, (limit,))
-            
-            return [dict(row) for row in cursor.fetchall()]
+                """, (file_type, limit), _RECENT_FILE_COLUMNS)
+            return _fetch_dicts(conn, f"""
+                SELECT {_select_list(_RECENT_FILE_COLUMNS)} FROM recent_files 
+                ORDER BY created_at DESC LIMIT ?
+            """, (limit,), _RECENT_FILE_COLUMNS)
+    
+    def get_recent_file_paths(self, limit: int = 10) -> List[str]:
+        """获取最近文件路径（只取 path 列，不构造整行字典）"""
+        self._wait_for_writes()
+        with self._get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT path FROM recent_files 
+                ORDER BY created_at DESC LIMIT ?
+            """, (limit,))
+            return [row[0] for row in cursor.fetchall()]
     
     def search_files(self, keyword: str, limit: int = 10) -> List[Dict]:
         """搜索文件"""
+        self._wait_for_writes()
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM recent_files 
+            if self._fts_enabled and len(keyword) >= _FTS_MIN_QUERY_LEN:
+                return _fetch_dicts(conn, f"""
+                    SELECT {_select_list(_RECENT_FILE_COLUMNS, "r")} FROM recent_files r
+                    JOIN recent_files_fts f ON f.rowid = r.id
+                    WHERE recent_files_fts MATCH ?
+                    ORDER BY r.created_at DESC LIMIT ?
+                """, (_fts_phrase(keyword), limit), _RECENT_FILE_COLUMNS)
+            
+            return _fetch_dicts(conn, f"""
+                SELECT {_select_list(_RECENT_FILE_COLUMNS)} FROM recent_files 
                 WHERE path LIKE ? OR tags LIKE ?
                 ORDER BY created_at DESC LIMIT ?
-            """, (f"%{keyword}%", f"%{keyword}%", limit))
-            return [dict(row) for row in cursor.fetchall()]
+            """, (f"%{keyword}%", f"%{keyword}%", limit), _RECENT_FILE_COLUMNS)
     
     def _guess_file_type(self, path: str) -> str:
         """猜测文件类型"""
-        ext = Path(path).suffix.lower()
-        type_map = {
-            ".pdf": "document",
-            ".doc": "document", ".docx": "document",
-            ".xls": "spreadsheet", ".xlsx": "spreadsheet",
-            ".ppt": "presentation", ".pptx": "presentation",
-            ".jpg": "image", ".jpeg": "image", ".png": "image", ".gif": "image",
-            ".mp4": "video", ".avi": "video", ".mov": "video",
-            ".mp3": "audio", ".wav": "audio",
-            ".py": "code", ".js": "code", ".ts": "code", ".java": "code",
-            ".zip": "archive", ".rar": "archive", ".7z": "archive",
-        }
-        return type_map.get(ext, "other")
+        return _FILE_TYPE_MAP.get(os.path.splitext(path)[1].lower(), "other")
     
     # ========== 会话摘要 ==========
     
@@ -284,8 +739,7 @@ class StructuredMemory:
     ):
         """保存会话摘要"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
+            conn.execute("""
                 INSERT INTO sessions (session_id, summary, key_actions, files_involved, emotion)
                 VALUES (?, ?, ?, ?, ?)
                 ON CONFLICT(session_id) DO UPDATE SET
@@ -297,21 +751,20 @@ class StructuredMemory:
             """, (
                 session_id,
                 summary,
-                json.dumps(key_actions or [], ensure_ascii=False),
-                json.dumps(files_involved or [], ensure_ascii=False),
+                _json_text(key_actions, _EMPTY_LIST_JSON),
+                _json_text(files_involved, _EMPTY_LIST_JSON),
                 emotion
             ))
+        self._invalidate_context_cache()
         logger.debug(f"保存会话摘要: {session_id}")
     
     def get_recent_sessions(self, limit: int = 5) -> List[Dict]:
         """获取最近会话"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM sessions 
+            return _fetch_dicts(conn, f"""
+                SELECT {_select_list(_SESSION_COLUMNS)} FROM sessions 
                 ORDER BY updated_at DESC LIMIT ?
-            """, (limit,))
-            return [dict(row) for row in cursor.fetchall()]
+            """, (limit,), _SESSION_COLUMNS)
     
     # ========== 知识图谱 ==========
     
@@ -327,96 +780,127 @@ class StructuredMemory:
     ):
         """添加知识三元组"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
+            conn.execute("""
                 INSERT INTO knowledge_graph 
                 (subject, predicate, object, target, context, confidence, importance)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             """, (subject, predicate, obj, target, context, confidence, importance))
         logger.debug(f"添加知识: {subject} → {predicate} → {obj}")
     
+    def add_knowledge_many(
+        self,
+        triples: List[Tuple[str, str, str]],
+        confidence: float = 1.0,
+        importance: float = 0.5
+    ):
+        """批量添加知识三元组 (subject, predicate, object)，单次 executemany"""
+        if not triples:
+            return
+        with self._get_connection() as conn:
+            conn.executemany("""
+                INSERT INTO knowledge_graph 
+                (subject, predicate, object, confidence, importance)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(subj, pred, obj, confidence, importance) for subj, pred, obj in triples])
+        logger.debug(f"批量添加知识: {len(triples)} 条")
+    
     def query_knowledge(
         self,
         subject: Optional[str] = None,
         predicate: Optional[str] = None,
         obj: Optional[str] = None,
-        limit: int = 10
+        limit: int = 10,
+        exact: bool = False
     ) -> List[Dict]:
-        """查询知识图谱"""
+        """
+        查询知识图谱
+        
+        Args:
+            subject/predicate/obj: 过滤条件，默认按子串匹配
+            limit: 最多返回条数
+            exact: 为 True 时按等值匹配（索引查找），适合查询某个具体实体的全部事实
+        """
+        if exact:
+            filters = [
+                (column, value)
+                for column, value in (("subject", subject), ("predicate", predicate), ("object", obj))
+                if value
+            ]
+            if filters:
+                sql = _KNOWLEDGE_EXACT_QUERY_SQL[tuple(column for column, _ in filters)]
+                with self._get_connection() as conn:
+                    return _fetch_dicts(
+                        conn, sql, [value for _, value in filters] + [limit], _KNOWLEDGE_COLUMNS
+                    )
+        
+        like_params: List[Optional[str]] = []
+        match_terms = []
+        for column, value in (("subject", subject), ("predicate", predicate), ("object", obj)):
+            if value and self._fts_enabled and len(value) >= _FTS_MIN_QUERY_LEN:
+                # 列限定的短语查询，走全文索引
+                match_terms.append(f"{column} : {_fts_phrase(value)}")
+                value = None
+            pattern = f"%{value}%" if value else None
+            like_params.extend((pattern, pattern))
+        
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            conditions = []
-            params = []
-            
-            if subject:
-                conditions.append("subject LIKE ?")
-                params.append(f"%{subject}%")
-            if predicate:
-                conditions.append("predicate LIKE ?")
-                params.append(f"%{predicate}%")
-            if obj:
-                conditions.append("object LIKE ?")
-                params.append(f"%{obj}%")
-            
-            where_clause = " AND ".join(conditions) if conditions else "1=1"
-            params.append(limit)
-            
-            cursor.execute(f"""
-                SELECT * FROM knowledge_graph 
-                WHERE {where_clause}
-                ORDER BY importance DESC, created_at DESC 
-                LIMIT ?
-            """, params)
-            return [dict(row) for row in cursor.fetchall()]
+            if match_terms:
+                return _fetch_dicts(
+                    conn, _KNOWLEDGE_FTS_QUERY_SQL,
+                    [" AND ".join(match_terms), *like_params, limit], _KNOWLEDGE_COLUMNS
+                )
+            return _fetch_dicts(conn, _KNOWLEDGE_QUERY_SQL, [*like_params, limit], _KNOWLEDGE_COLUMNS)
     
     # ========== 习惯模式 ==========
     
     def record_habit(self, pattern_type: str, pattern_value: str, metadata: Optional[Dict] = None):
-        """记录习惯模式"""
+        """记录习惯模式（单条 UPSERT：不存在则插入，存在则频率 +1）"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            # 检查是否已存在
-            cursor.execute("""
-                SELECT id, frequency FROM habits 
-                WHERE pattern_type = ? AND pattern_value = ?
-            """, (pattern_type, pattern_value))
-            row = cursor.fetchone()
-            
-            if row:
-                # 更新频率
-                cursor.execute("""
-                    UPDATE habits SET 
-                        frequency = frequency + 1,
-                        last_seen = CURRENT_TIMESTAMP,
-                        metadata = ?
-                    WHERE id = ?
-                """, (json.dumps(metadata or {}, ensure_ascii=False), row["id"]))
-            else:
-                # 新增
-                cursor.execute("""
-                    INSERT INTO habits (pattern_type, pattern_value, metadata)
-                    VALUES (?, ?, ?)
-                """, (pattern_type, pattern_value, json.dumps(metadata or {}, ensure_ascii=False)))
-        
+            conn.execute("""
+                INSERT INTO habits (pattern_type, pattern_value, metadata, frequency)
+                VALUES (?, ?, ?, 1)
+                ON CONFLICT(pattern_type, pattern_value) DO UPDATE SET
+                    frequency = frequency + 1,
+                    last_seen = CURRENT_TIMESTAMP,
+                    metadata = excluded.metadata
+            """, (pattern_type, pattern_value, _json_text(metadata, _EMPTY_DICT_JSON)))
+        self._invalidate_context_cache()
         logger.debug(f"记录习惯: {pattern_type} = {pattern_value}")
     
+    def record_habits(self, counts: Dict[Tuple[str, str], int]):
+        """
+        批量记录习惯模式（单个事务）
+        
+        Args:
+            counts: {(pattern_type, pattern_value): 新增次数}
+        """
+        if not counts:
+            return
+        with self._get_connection() as conn:
+            conn.executemany("""
+                INSERT INTO habits (pattern_type, pattern_value, frequency, metadata)
+                VALUES (?, ?, ?, '{}')
+                ON CONFLICT(pattern_type, pattern_value) DO UPDATE SET
+                    frequency = frequency + excluded.frequency,
+                    last_seen = CURRENT_TIMESTAMP
+            """, [(pattern_type, pattern_value, count) for (pattern_type, pattern_value), count in counts.items()])
+        self._invalidate_context_cache()
+        logger.debug(f"批量记录习惯: {len(counts)} 项")
+    
     def get_habits(self, pattern_type: Optional[str] = None, min_frequency: int = 1) -> List[Dict]:
         """获取习惯模式"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
             if pattern_type:
-                cursor.execute("""
-                    SELECT * FROM habits 
+                return _fetch_dicts(conn, f"""
+                    SELECT {_select_list(_HABIT_COLUMNS)} FROM habits 
                     WHERE pattern_type = ? AND frequency >= ?
                     ORDER BY frequency DESC
-                """, (pattern_type, min_frequency))
-            else:
-                cursor.execute("""
-                    SELECT * FROM habits 
-                    WHERE frequency >= ?
-                    ORDER BY frequency DESC
-                """, (min_frequency,))
-            return [dict(row) for row in cursor.fetchall()]
+                """, (pattern_type, min_frequency), _HABIT_COLUMNS)
+            return _fetch_dicts(conn, f"""
+                SELECT {_select_list(_HABIT_COLUMNS)} FROM habits 
+                WHERE frequency >= ?
+                ORDER BY frequency DESC
+            """, (min_frequency,), _HABIT_COLUMNS)
     
     # ========== 指令历史 ==========
     
@@ -429,79 +913,138 @@ class StructuredMemory:
         duration: float = 0
     ):
         """添加指令历史"""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO instruction_history 
-                (instruction, normalized, steps, success, duration_seconds)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                instruction,
-                normalized or self._normalize_instruction(instruction),
-                json.dumps(steps or [], ensure_ascii=False),
-                success,
-                duration
-            ))
-        logger.debug(f"添加指令历史: {instruction[:50]}...")
+        self.add_instructions([{
+            "instruction": instruction,
+            "normalized": normalized,
+            "steps": steps,
+            "success": success,
+            "duration": duration,
+        }])
+    
+    def add_instructions(self, records: List[Dict]):
+        """
+        批量添加指令历史（单个事务内 executemany；事务外调用时由后台写线程提交）
+        
+        Args:
+            records: [{instruction, normalized?, steps?, success?, duration?}, ...]
+        """
+        if not records:
+            return
+        rows = [
+            (
+                r["instruction"],
+                r.get("normalized") or self._normalize_instruction(r["instruction"]),
+                _json_text(r.get("steps"), _EMPTY_LIST_JSON),
+                r.get("success", True),
+                r.get("duration", 0)
+            )
+            for r in records
+        ]
+        self._queue_rows("instruction_history", rows)
+        logger.debug(f"添加指令历史: {len(rows)} 条")
     
     def get_similar_instructions(self, instruction: str, limit: int = 5) -> List[Dict]:
-        """获取相似指令（简单关键词匹配）"""
+        """获取相似指令（FTS5 BM25 相关度排序；短关键词回退到 LIKE 匹配）"""
+        self._wait_for_writes()
         normalized = self._normalize_instruction(instruction)
         keywords = normalized.split()
+        if not keywords:
+            return []
         
         with self._get_connection() as conn:
-            cursor = conn.cursor()
+            if self._fts_enabled and all(len(kw) >= _FTS_MIN_QUERY_LEN for kw in keywords):
+                return _fetch_dicts(conn, f"""
+                    SELECT {_select_list(_INSTRUCTION_COLUMNS, "h")}, bm25(instruction_history_fts) AS score
+                    FROM instruction_history h
+                    JOIN instruction_history_fts f ON f.rowid = h.id
+                    WHERE instruction_history_fts MATCH ?
+                    ORDER BY score, h.created_at DESC LIMIT ?
+                """, (" OR ".join(_fts_phrase(kw) for kw in keywords), limit), _INSTRUCTION_COLUMNS + ("score",))
+            
             # 简单的关键词匹配
             conditions = " OR ".join(["normalized LIKE ?" for _ in keywords])
             params = [f"%{kw}%" for kw in keywords]
             params.append(limit)
             
-            cursor.execute(f"""
-                SELECT * FROM instruction_history 
+            return _fetch_dicts(conn, f"""
+                SELECT {_select_list(_INSTRUCTION_COLUMNS)} FROM instruction_history 
                 WHERE {conditions}
                 ORDER BY created_at DESC LIMIT ?
-            """, params)
-            return [dict(row) for row in cursor.fetchall()]
+            """, params, _INSTRUCTION_COLUMNS)
     
     def _normalize_instruction(self, instruction: str) -> str:
         """标准化指令（用于匹配）"""
-        import re
         # 移除数字、特殊字符，转小写
-        normalized = re.sub(r'[0-9\.\-\_\/\\]', ' ', instruction.lower())
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
-        return normalized
+        return _RE_WS.sub(' ', _RE_NONWORD.sub(' ', instruction.lower())).strip()
+    
+    # ========== 内部元数据 ==========
+    
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """读取内部元数据"""
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row["value"] if row else default
+    
+    def set_meta(self, key: str, value: Any):
+        """写入内部元数据"""
+        with self._get_connection() as conn:
+            conn.execute("""
+                INSERT INTO meta (key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            """, (key, str(value)))
     
     # ========== 清理 ==========
     
     def cleanup_old_data(self, days: int = 90):
         """清理旧数据（保留重要的）"""
-        cutoff = datetime.now() - timedelta(days=days)
-        cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+        self._wait_for_writes()
+        # 截止时间由 SQLite 计算（UTC，与 CURRENT_TIMESTAMP 写入的 created_at 一致）
+        age = f"-{int(days)} days"
         
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # 清理文件历史（保留最近的）
-            cursor.execute("""
+            # 清理文件历史（保留最近的）：按时间索引倒序跳过最近 100 条，剩余的旧记录删除
+            conn.execute("""
                 DELETE FROM recent_files 
-                WHERE created_at < ? 
-                AND id NOT IN (SELECT id FROM recent_files ORDER BY created_at DESC LIMIT 100)
-            """, (cutoff_str,))
+                WHERE id IN (
+                    SELECT id FROM recent_files ORDER BY created_at DESC LIMIT -1 OFFSET 100
+                )
+                AND created_at < datetime('now', ?)
+            """, (age,))
             
             # 清理知识图谱（保留重要的）
-            cursor.execute("""
+            conn.execute("""
                 DELETE FROM knowledge_graph 
-                WHERE created_at < ? AND importance < 0.8
-            """, (cutoff_str,))
+                WHERE created_at < datetime('now', ?) AND importance < 0.8
+            """, (age,))
             
             # 清理指令历史
-            cursor.execute("""
+            conn.execute("""
                 DELETE FROM instruction_history 
-                WHERE created_at < ?
-                AND id NOT IN (SELECT id FROM instruction_history ORDER BY created_at DESC LIMIT 500)
-            """, (cutoff_str,))
+                WHERE id IN (
+                    SELECT id FROM instruction_history ORDER BY created_at DESC LIMIT -1 OFFSET 500
+                )
+                AND created_at < datetime('now', ?)
+            """, (age,))
             
             logger.info(f"清理了 {days} 天前的旧数据")
+        
+        self._invalidate_context_cache()
+        self._reclaim_free_pages()
+    
+    def _reclaim_free_pages(self, max_pages: int = 1000):
+        """归还删除后空出的页（incremental_vacuum 需在事务外执行）"""
+        conn = self._thread_connection()
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # 旧库创建时未开启增量模式：VACUUM 一次完成转换（同时整理全部空闲页）
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                logger.info("已将数据库转换为增量 auto_vacuum 模式")
+                return
+            # executescript 会把 PRAGMA 执行到底（execute 只步进一次，只释放一页）
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+        except sqlite3.Error as e:
+            logger.warning(f"回收空闲页失败: {e}")
     
     # ========== 导出记忆上下文 ==========
     
@@ -509,33 +1052,66 @@ class StructuredMemory:
         """
         获取记忆上下文（用于注入 prompt）
         
+        两次写入之间的重复调用直接返回缓存结果（按 limit_per_category 分别缓存）。
+        
         Returns:
             格式化的记忆上下文字符串
         """
-        context_parts = []
-        
-        # 1. 用户偏好
-        prefs = self.get_all_preferences()
-        if prefs:
-            pref_items = [f"- {k}: {v}" for k, v in list(prefs.items())[:limit_per_category]]
-            context_parts.append("**用户偏好**：\n" + "\n".join(pref_items))
+        self._wait_for_writes()
+        version = self._ctx_version
+        cached = self._ctx_cache.get(limit_per_category)
+        if cached and cached[0] == version and time.monotonic() - cached[1] < self.CONTEXT_CACHE_TTL:
+            return cached[2]
         
-        # 2. 最近文件
-        files = self.get_recent_files(limit=limit_per_category)
-        if files:
-            file_items = [f"- {f['path']} ({f['operation']}, {f['created_at'][:10]})" for f in files]
-            context_parts.append("**最近文件**：\n" + "\n".join(file_items))
-        
-        # 3. 常用习惯
-        habits = self.get_habits(min_frequency=2)[:limit_per_category]
-        if habits:
-            habit_items = [f"- {h['pattern_type']}: {h['pattern_value']} (使用{h['frequency']}次)" for h in habits]
-            context_parts.append("**用户习惯**：\n" + "\n".join(habit_items))
+        context = self._build_memory_context(limit_per_category)
+        # 记录查询前的版本号：查询期间若有写入，下次调用会重新生成
+        self._ctx_cache[limit_per_category] = (version, time.monotonic(), context)
+        return context
+    
+    def _build_memory_context(self, limit_per_category: int) -> str:
+        """查询四类记忆并格式化为上下文文本"""
+        context_parts = []
         
-        # 4. 最近会话
-        sessions = self.get_recent_sessions(limit=3)
-        if sessions:
-            session_items = [f"- {s['summary'][:100]}" for s in sessions if s.get('summary')]
+        # 四类查询在同一连接、同一读事务内完成，并把 LIMIT 下推到 SQL
+        with self._get_connection() as conn:
+            cursor = _tuple_cursor(conn)
+            
+            # 1. 用户偏好
+            prefs = cursor.execute(
+                "SELECT key, value FROM preferences LIMIT ?", (limit_per_category,)
+            ).fetchall()
+            if prefs:
+                pref_items = [f"- {key}: {_decode_value(value)}" for key, value in prefs]
+                context_parts.append("**用户偏好**：\n" + "\n".join(pref_items))
+            
+            # 2. 最近文件
+            files = cursor.execute("""
+                SELECT path, operation, created_at FROM recent_files 
+                ORDER BY created_at DESC LIMIT ?
+            """, (limit_per_category,)).fetchall()
+            if files:
+                file_items = [f"- {path} ({operation}, {created_at[:10]})" for path, operation, created_at in files]
+                context_parts.append("**最近文件**：\n" + "\n".join(file_items))
+            
+            # 3. 常用习惯
+            habits = cursor.execute("""
+                SELECT pattern_type, pattern_value, frequency FROM habits 
+                WHERE frequency >= 2
+                ORDER BY frequency DESC LIMIT ?
+            """, (limit_per_category,)).fetchall()
+            if habits:
+                habit_items = [
+                    f"- {pattern_type}: {pattern_value} (使用{frequency}次)"
+                    for pattern_type, pattern_value, frequency in habits
+                ]
+                context_parts.append("**用户习惯**：\n" + "\n".join(habit_items))
+            
+            # 4. 最近会话
+            sessions = cursor.execute("""
+                SELECT summary FROM sessions 
+                ORDER BY updated_at DESC LIMIT 3
+            """).fetchall()
+            session_items = [f"- {summary[:100]}" for (summary,) in sessions if summary]
             if session_items:
                 context_parts.append("**最近会话**：\n" + "\n".join(session_items))
         
@@ -13,8 +13,10 @@ import hashlib
 import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
@@ -22,11 +24,14 @@ logger = logging.getLogger(__name__)
 class VectorMemory:
     """向量记忆 - Chroma 存储"""
     
+    EMBED_CACHE_SIZE = 256  # 嵌入缓存条数（同一文本只做一次前向计算）
+    
     def __init__(
         self,
         db_path: Optional[Path] = None,
         model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
         auto_install: bool = True,
+        index_params: Optional[Dict[str, Any]] = None,
     ):
         """
         初始化向量记忆
@@ -35,13 +40,18 @@ class VectorMemory:
             db_path: 数据库路径，默认 ~/.deskjarvis/vector_memory
             model_name: 嵌入模型名称
             auto_install: 是否在缺失依赖时自动安装（需要网络）
+            index_params: Chroma HNSW 索引参数，如 {"hnsw:M": 8, "hnsw:search_ef": 20}
+                （只在集合首次创建时生效，已有集合保持原参数）
         """
         self.enabled = False
+        self._index_params: Dict[str, Any] = dict(index_params or {})
         self._chromadb = None
         self._SentenceTransformer = None
         self.model = None
         self._model_ready = threading.Event()
         self._model_load_error: Optional[Exception] = None
+        self._embed_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embed_lock = threading.Lock()
 
         ok = self._ensure_dependencies(auto_install=auto_install)
         if not ok:
@@ -75,6 +85,9 @@ class VectorMemory:
         
         # 创建集合
         self._init_collections()
+        
+        # 三个集合的检索互不依赖，并发执行
+        self._search_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="VectorSearch")
         logger.info(f"向量记忆已初始化（嵌入模型在后台加载中）: {self.db_path}")
 
     def _init_chroma_client(self):
@@ -248,19 +261,19 @@ class VectorMemory:
         # 对话记忆集合
         self.conversations = self.client.get_or_create_collection(
             name="conversations",
-            metadata={"description": "对话历史记忆"}
+            metadata={"description": "对话历史记忆", **self._index_params}
         )
         
         # 指令模式集合
         self.instructions = self.client.get_or_create_collection(
             name="instructions",
-            metadata={"description": "指令模式记忆"}
+            metadata={"description": "指令模式记忆", **self._index_params}
         )
         
         # 压缩摘要集合
         self.summaries = self.client.get_or_create_collection(
             name="summaries",
-            metadata={"description": "压缩后的记忆摘要"}
+            metadata={"description": "压缩后的记忆摘要", **self._index_params}
         )
         
         # 执行数据整理/迁移（将字符串时间戳改为数值）
@@ -323,14 +336,47 @@ class VectorMemory:
     def _embed(self, text: str) -> List[float]:
         """
         生成文本嵌入。
-        委托给 SharedEmbeddingModel 处理
+        委托给 SharedEmbeddingModel 处理，结果按文本做 LRU 缓存
         """
         if not self.enabled:
             return []
-            
-        return self._shared_model.encode(text)
+        
+        with self._embed_lock:
+            cached = self._embed_cache.get(text)
+            if cached is not None:
+                self._embed_cache.move_to_end(text)
+                return cached
+        
+        embedding = self._shared_model.encode(text)
+        if embedding:  # 模型未就绪时返回空列表，不缓存
+            with self._embed_lock:
+                self._embed_cache[text] = embedding
+                if len(self._embed_cache) > self.EMBED_CACHE_SIZE:
+                    self._embed_cache.popitem(last=False)
+        return embedding
 
     
+    def warmup(self, timeout: float = 120.0):
+        """
+        预热：等待嵌入模型就绪，做一次推理并查询各集合，
+        让模型与向量索引提前加载到内存，避免首个请求承担冷启动开销。
+        适合在后台线程中调用。
+        """
+        if not self.enabled:
+            return
+        try:
+            if not self._shared_model.wait_until_ready(timeout=timeout):
+                return
+            embedding = self._shared_model.encode("warmup")
+            if not embedding:
+                return
+            for collection in (self.conversations, self.instructions, self.summaries):
+                if collection.count():
+                    collection.query(query_embeddings=[embedding], n_results=1)
+            logger.debug("向量记忆预热完成")
+        except Exception as e:
+            logger.debug(f"向量记忆预热失败（忽略）: {e}")
+    
     # ========== 对话记忆 ==========
     
     def add_conversation(
@@ -387,7 +433,8 @@ class VectorMemory:
         self,
         query: str,
         limit: int = 5,
-        filter_success: Optional[bool] = None
+        filter_success: Optional[bool] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict]:
         """
         搜索相似对话
@@ -396,6 +443,7 @@ class VectorMemory:
             query: 搜索查询
             limit: 返回数量
             filter_success: 只返回成功/失败的任务
+            query_embedding: 已计算好的查询向量（提供时跳过嵌入）
         
         Returns:
             相似对话列表
@@ -403,7 +451,8 @@ class VectorMemory:
         if not self.enabled:
             return []
         
-        query_embedding = self._embed(query)
+        if query_embedding is None:
+            query_embedding = self._embed(query)
         if not query_embedding:
             return []  # 模型未就绪
         
@@ -496,7 +545,8 @@ class VectorMemory:
         self,
         instruction: str,
         limit: int = 3,
-        min_similarity: float = 0.7
+        min_similarity: float = 0.7,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict]:
         """
         查找相似指令
@@ -505,6 +555,7 @@ class VectorMemory:
             instruction: 当前指令
             limit: 返回数量
             min_similarity: 最小相似度阈值
+            query_embedding: 已计算好的查询向量（提供时跳过嵌入）
         
         Returns:
             相似指令列表
@@ -512,7 +563,8 @@ class VectorMemory:
         if not self.enabled:
             return []
         
-        query_embedding = self._embed(instruction)
+        if query_embedding is None:
+            query_embedding = self._embed(instruction)
         if not query_embedding:
             return []  # 模型未就绪
         
@@ -648,12 +700,18 @@ class VectorMemory:
             
             logger.info(f"压缩了 {date_key} 的 {len(items)} 条记忆")
     
-    def search_summaries(self, query: str, limit: int = 3) -> List[Dict]:
+    def search_summaries(
+        self,
+        query: str,
+        limit: int = 3,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
         """搜索压缩摘要"""
         if not self.enabled:
             return []
         
-        query_embedding = self._embed(query)
+        if query_embedding is None:
+            query_embedding = self._embed(query)
         if not query_embedding:
             return []  # 模型未就绪
         
@@ -678,9 +736,14 @@ class VectorMemory:
     
     # ========== 统一搜索 ==========
     
-    def search_all(self, query: str, limit: int = 5) -> Dict[str, List]:
+    def search_all(
+        self,
+        query: str,
+        limit: int = 5,
+        query_embedding: Optional[List[float]] = None
+    ) -> Dict[str, List]:
         """
-        统一搜索所有记忆
+        统一搜索所有记忆（查询只嵌入一次，三个集合共用）
         
         Returns:
             {
@@ -692,21 +755,35 @@ class VectorMemory:
         if not self.enabled:
             return {"conversations": [], "instructions": [], "summaries": []}
         
+        if query_embedding is None:
+            query_embedding = self._embed(query)
+        if not query_embedding:
+            return {"conversations": [], "instructions": [], "summaries": []}  # 模型未就绪
+        
+        convs = self._search_pool.submit(self.search_conversations, query, limit, query_embedding=query_embedding)
+        insts = self._search_pool.submit(self.find_similar_instructions, query, limit, query_embedding=query_embedding)
+        sums = self._search_pool.submit(self.search_summaries, query, limit, query_embedding=query_embedding)
         return {
-            "conversations": self.search_conversations(query, limit),
-            "instructions": self.find_similar_instructions(query, limit),
-            "summaries": self.search_summaries(query, limit)
+            "conversations": convs.result(),
+            "instructions": insts.result(),
+            "summaries": sums.result()
         }
     
     # ========== 导出记忆上下文 ==========
     
-    def get_memory_context(self, query: str, limit: int = 3) -> str:
+    def get_memory_context(
+        self,
+        query: str,
+        limit: int = 3,
+        query_embedding: Optional[List[float]] = None
+    ) -> str:
         """
         获取与查询相关的记忆上下文
         
         Args:
             query: 当前查询/指令
             limit: 每类最多返回数量
+            query_embedding: 已计算好的查询向量（提供时跳过嵌入）
         
         Returns:
             格式化的记忆上下文
@@ -714,10 +791,21 @@ class VectorMemory:
         if not self.enabled:
             return ""
         
+        # 查询只嵌入一次，三类搜索共用
+        if query_embedding is None:
+            query_embedding = self._embed(query)
+        if not query_embedding:
+            return ""  # 模型未就绪
+        
+        # 三类搜索并发执行
+        convs_future = self._search_pool.submit(self.search_conversations, query, limit, query_embedding=query_embedding)
+        insts_future = self._search_pool.submit(self.find_similar_instructions, query, limit, query_embedding=query_embedding)
+        sums_future = self._search_pool.submit(self.search_summaries, query, limit=2, query_embedding=query_embedding)
+        
         context_parts = []
         
         # 搜索相关对话
-        convs = self.search_conversations(query, limit)
+        convs = convs_future.result()
         if convs:
             conv_items = []
             for c in convs:
@@ -728,7 +816,7 @@ class VectorMemory:
             context_parts.append("**相关历史对话**：\n" + "\n".join(conv_items))
         
         # 搜索相似指令
-        insts = self.find_similar_instructions(query, limit)
+        insts = insts_future.result()
         if insts:
             inst_items = []
             for inst in insts:
@@ -738,7 +826,7 @@ class VectorMemory:
             context_parts.append("**相似任务记录**：\n" + "\n".join(inst_items))
         
         # 搜索摘要
-        sums = self.search_summaries(query, limit=2)
+        sums = sums_future.result()
         if sums:
             sum_items = [s.get("summary", "")[:200] for s in sums]
             context_parts.append("**历史摘要**：\n" + "\n".join(sum_items))
@@ -753,6 +841,12 @@ class VectorMemory:
             # 新版 PersistentClient 自动持久化，无需手动调用
             logger.debug("向量记忆自动持久化中")
     
+    def close(self):
+        """关闭检索线程池（未启用时没有线程池，直接返回）"""
+        search_pool = getattr(self, "_search_pool", None)
+        if search_pool is not None:
+            search_pool.shutdown(wait=False)
+    
     def get_stats(self) -> Dict:
         """获取统计信息"""
         if not self.enabled:
@@ -8,14 +8,289 @@ Plan Executor - Agent Execution Engine
 - 向前端发送实时事件 (Emit)
 """
 
+import asyncio
+import contextvars
 import logging
-from typing import Dict, Any, List, Callable
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from types import MappingProxyType
+from functools import lru_cache
+from typing import Dict, Any, List, Callable, Mapping, Optional, Tuple
 
-from agent.tools.exceptions import PlaceholderError
+from agent.orchestrator.reflector import Reflector
+from agent.tools.exceptions import PlaceholderError, TaskInterruptedException
 from agent.tools.log_sanitizer import LogSanitizer
 
 logger = logging.getLogger(__name__)
 
+# 敏感操作等待用户确认的最长时间（秒）
+SENSITIVE_CONFIRM_TIMEOUT = 30.0
+# 等待确认期间检查停止标志的间隔（秒）；确认本身通过 Event 立即唤醒，不受此间隔影响
+_STOP_CHECK_INTERVAL = 1.0
+# 被停止放弃的工具调用在下一次工具调用前最多再等待的时间（秒），超时视为卡死并替换工具线程
+_ABANDONED_TOOL_GRACE = 5.0
+# 原样重试前的指数退避：0.25s, 0.5s, 1s ... 最多 2s
+_RETRY_BASE_DELAY = 0.25
+_RETRY_MAX_DELAY = 2.0
+
+# 占位符 {{stepN.path}}，以及路径中的索引段 key[idx]
+_PLACEHOLDER_RE = re.compile(r'\{\{step(\d+)\.([^}]+)\}\}')
+_INDEX_RE = re.compile(r'(\w+)\[(\d+)\]')
+# system_control 修复时从 action 中解析音量/亮度：整数、百分比、整数或小数
+_INT_RE = re.compile(r'\d+')
+_PERCENT_RE = re.compile(r'(\d+)%')
+_NUMBER_RE = re.compile(r'(\d+\.?\d*)')
+
+# === 执行器路由规则（替代硬编码列表），格式：{step_type: executor_name} ===
+# 文件操作
+_FILE_OPS = (
+    "file_create", "file_read", "file_write", "file_delete",
+    "file_rename", "file_move", "file_copy", "file_organize",
+    "file_classify", "file_batch_rename", "file_batch_copy",
+    "file_batch_organize", "create_file", "read_file", 
+    "list_dir", "delete_file"
+)
+# 浏览器操作
+_BROWSER_OPS = (
+    "browser_navigate", "browser_click", "browser_fill", "browser_wait",
+    "browser_screenshot", "browser_check_element", "download_file",
+    "request_login", "request_captcha", "request_qr_login",
+    "open_url", "click", "type", "scroll", "scrape", "screenshot_web"
+)
+# 系统操作
+_SYSTEM_OPS = (
+    "screenshot_desktop", "open_app", "close_app", "set_volume", 
+    "set_brightness", "get_system_info", "open_folder", "open_file", 
+    "text_process", "python_script", "python", "code_interpreter"
+)
+# 邮件操作
+_EMAIL_OPS = (
+    "send_email", "search_emails", "get_email_details", 
+    "download_attachments", "manage_emails", "compress_files"
+)
+
+_EXECUTOR_REGISTRY: Mapping[str, str] = MappingProxyType({
+    sys.intern(op): sys.intern(name)
+    for ops, name in (
+        (_FILE_OPS, "file_manager"),
+        (_BROWSER_OPS, "browser_executor"),
+        (_SYSTEM_OPS, "system_tools"),
+        (_EMAIL_OPS, "email_executor"),
+    )
+    for op in ops
+})
+
+# Reflector 有时把执行器名当作步骤类型生成，兼容映射到 file_manager
+_FILE_RELATED_ERROR_TYPES = frozenset(("file_manager", "FileManager", "file_operation"))
+
+# 直接交给 CodeInterpreter 执行的 Python 代码步骤
+_PYTHON_STEP_TYPES = frozenset(("python_script", "python"))
+
+# 错误类型修复：按 action 关键词推断具体类型（按顺序取第一个匹配，均未匹配时默认 file_delete）
+_ACTION_TYPE_MAP = (
+    (re.compile(r"delete|删除"), "file_delete"),
+    (re.compile(r"read|读取"), "file_read"),
+    (re.compile(r"write|写入"), "file_write"),
+)
+_APP_CONTROL_CLOSE_RE = re.compile(r"close|关闭")
+
+# 执行器调用入口：(入口类型, 方法名)，按优先级排列
+_EXEC_METHOD_NAMES = (
+    ("file", "execute_file_operation"),     # FileManager
+    ("browser", "execute_browser_action"),  # BrowserExecutor
+    ("step", "execute_step"),               # SystemTools, EmailExecutor 等通用入口
+)
+
+
+@lru_cache(maxsize=1024)
+def _parse_path(path: str) -> Tuple[Tuple[str, Optional[int]], ...]:
+    """
+    解析占位符路径（同一路径在各步骤间反复出现，解析结果缓存）
+    
+    例如 "result[0].id" -> (("result", 0), ("id", None))
+    """
+    parts = []
+    for part in path.split('.'):
+        match = _INDEX_RE.match(part)
+        if match:
+            parts.append((match.group(1), int(match.group(2))))
+        else:
+            parts.append((part, None))
+    return tuple(parts)
+
+
+
+def _deep_get(obj: Any, parts: Tuple[Tuple[str, Optional[int]], ...]) -> Any:
+    """
+    按已解析的路径逐级取值，任何一级不存在时返回 None
+    
+    每级 (key, idx)：先按 key 取字典值（列表则把数字 key 当下标），idx 不为 None 时再按下标取值。
+    """
+    current = obj
+    for key, idx in parts:
+        if current is None:
+            return None
+        
+        if isinstance(current, dict):
+            current = current.get(key)
+        elif isinstance(current, list) or (idx is None and isinstance(current, tuple)):
+            # 列表/元组上 key 应该是数字索引（无索引段时要求 key 全是数字）
+            if idx is None and not key.isdigit():
+                return None
+            try:
+                current = current[int(key)]
+            except (IndexError, ValueError, TypeError):
+                return None
+        else:
+            return None
+        
+        if idx is not None:
+            if not isinstance(current, (list, tuple)):
+                # 带索引但取到的不是列表/元组，说明路径错误
+                return None
+            try:
+                current = current[idx]
+            except (IndexError, TypeError):
+                return None
+    return current
+
+# === 常驻工具线程 ===
+# 所有 PlanExecutor 共享一个单线程池：工具实例（如 BrowserExecutor）跨任务复用，
+# Playwright 同步 API 的对象绑定在启动它的线程上，所有工具调用（含浏览器的懒启动）都必须在同一线程执行。
+# 单线程同时保证被停止而放弃等待的工具调用不会与后续工具调用并发。
+# 限制：被放弃的调用在宽限期后仍未结束时，工具线程会被替换（否则之后所有任务都排在它后面），
+# 旧线程上创建的线程绑定对象（如已启动的浏览器）在新线程中不可用。
+_TOOL_POOL: Optional[ThreadPoolExecutor] = None
+_TOOL_THREAD: Optional[threading.Thread] = None
+_TOOL_POOL_LOCK = threading.Lock()
+_ABANDONED_TOOL: Optional[Future] = None
+
+
+def _get_tool_pool() -> ThreadPoolExecutor:
+    """获取（首次调用或旧线程卡死时创建）常驻工具线程池"""
+    global _TOOL_POOL, _TOOL_THREAD, _ABANDONED_TOOL
+    abandoned = _ABANDONED_TOOL
+    if abandoned is not None:
+        try:
+            abandoned.result(timeout=_ABANDONED_TOOL_GRACE)
+            stuck = False
+        except FutureTimeoutError:
+            stuck = True
+        except Exception:
+            stuck = False
+        with _TOOL_POOL_LOCK:
+            if _ABANDONED_TOOL is abandoned:
+                _ABANDONED_TOOL = None
+                if stuck and _TOOL_POOL is not None:
+                    logger.warning("被停止的工具调用仍未结束，替换工具线程")
+                    _TOOL_POOL.shutdown(wait=False)
+                    _TOOL_POOL = None
+                    _TOOL_THREAD = None
+    
+    if _TOOL_POOL is None:
+        with _TOOL_POOL_LOCK:
+            if _TOOL_POOL is None:
+                pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plan-tools")
+                _TOOL_THREAD = pool.submit(threading.current_thread).result()
+                _TOOL_POOL = pool
+    return _TOOL_POOL
+
+
+def _abandon_tool_call(future: Future):
+    """记录被停止放弃的工具调用（下一次获取工具线程时检查它是否卡死）"""
+    global _ABANDONED_TOOL
+    if not future.done():
+        with _TOOL_POOL_LOCK:
+            _ABANDONED_TOOL = future
+
+
+def _stop_checker(context: Dict[str, Any]) -> Callable[[], bool]:
+    """
+    根据 context 构造停止检查函数（每个计划/步骤构造一次，避免每次检查都查字典和做类型判断）
+    
+    支持三种方式：stop_event、检查函数 _check_stop、直接标志 _stop_execution（无检查函数时生效）
+    """
+    stop_event = context.get("_stop_event")
+    if not isinstance(stop_event, threading.Event):
+        stop_event = None
+    check_stop = context.get("_check_stop")
+    if not callable(check_stop):
+        check_stop = None
+    
+    def is_stopped() -> bool:
+        if stop_event is not None and stop_event.is_set():
+            return True
+        if check_stop is not None:
+            return bool(check_stop())
+        return bool(context.get("_stop_execution", False))
+    
+    return is_stopped
+
+
+def _has_placeholder(value: Any) -> bool:
+    """参数树中是否有包含 "{{" 的字符串（迭代遍历，命中即返回）"""
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, str):
+            if "{{" in obj:
+                return True
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+    return False
+
+
+def _find_null_id(params: Any) -> Optional[str]:
+    """查找参数树中第一个值为 NULL_ID 的路径（迭代遍历，命中即返回），没有则返回 None"""
+    stack = [("", params)]
+    while stack:
+        path, obj = stack.pop()
+        if isinstance(obj, str):
+            if obj == "NULL_ID":
+                return path or "root"
+        elif isinstance(obj, dict):
+            stack.extend((f"{path}.{key}" if path else key, value) for key, value in obj.items())
+        elif isinstance(obj, list):
+            stack.extend((f"{path}[{idx}]", item) for idx, item in enumerate(obj))
+    return None
+
+class _EmitBatcher:
+    """
+    事件合并发送器：暂存连续的 emit 调用，在阻塞点（执行工具、等待确认、调用 Reflector、
+    退避等待、计划结束）一次性发出，减少前端 IPC 写入和刷新次数。
+    
+    回调声明 supports_batch 时，多个事件合并为一个 ("batch", {"events": [...]}) 调用；
+    否则按原顺序逐个回调。
+    """
+    
+    def __init__(self, callback: Callable):
+        self._callback = callback
+        self._supports_batch = bool(getattr(callback, "supports_batch", False))
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+    
+    def emit(self, event_type: str, data: Dict[str, Any]):
+        """暂存事件（保持发送顺序）"""
+        with self._lock:
+            self._pending.append({"event": event_type, "data": data})
+    
+    def flush(self):
+        """发出所有暂存事件"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        if len(pending) > 1 and self._supports_batch:
+            self._callback("batch", {"events": pending})
+            return
+        for item in pending:
+            self._callback(item["event"], item["data"])
+
 class PlanExecutor:
     """
     负责执行规划好的步骤列表，并处理单步重试与反思。
@@ -30,12 +305,32 @@ class PlanExecutor:
         """
         self.config = config
         self.tools = tools_map
-        self.emit = emit_callback
+        # 事件先暂存，在阻塞点统一发出（见 _EmitBatcher）
+        self._emit_batcher = _EmitBatcher(emit_callback)
+        self.emit = self._emit_batcher.emit
         self.reflector = None
+        # 当前正在执行的计划上下文（confirm_sensitive 通过它写入确认结果）
+        self._active_context: Optional[Dict[str, Any]] = None
         
         # === 执行器注册机制（替代硬编码列表）===
-        self.executor_registry: Dict[str, str] = {}
-        self._register_executors()
+        # 路由表是静态的，模块加载时构建一次，所有实例共享
+        self.executor_registry: Mapping[str, str] = _EXECUTOR_REGISTRY
+        
+        # 步骤类型 → 执行器实例，初始化时解析一次，查找只需一次字典访问
+        self._executor_by_type: Dict[str, Any] = {
+            step_type: tools_map[name]
+            for step_type, name in self.executor_registry.items()
+            if tools_map.get(name)
+        }
+        if tools_map.get("file_manager"):
+            self._executor_by_type.update(
+                (step_type, tools_map["file_manager"]) for step_type in _FILE_RELATED_ERROR_TYPES
+            )
+        
+        # 各执行器的调度函数只在初始化时生成一次：{id(executor): dispatch(step_type, params, step, context)}
+        self._dispatchers: Dict[int, Callable[..., Dict[str, Any]]] = {
+            id(executor): self._make_dispatcher(executor) for executor in tools_map.values()
+        }
         
     def execute_plan(
         self, 
@@ -60,92 +355,83 @@ class PlanExecutor:
             "attempt": 1
         })
         
-        # 初始化 step_results 用于占位符替换
-        if "step_results" not in context:
-            context["step_results"] = []
-        
-        for i, step in enumerate(plan):
-            # 🔴 CRITICAL: 检查停止标志（支持三种方式：stop_event、检查函数、直接标志）
-            import threading
-            stop_event = context.get("_stop_event")
-            if stop_event and isinstance(stop_event, threading.Event) and stop_event.is_set():
-                logger.info("检测到停止标志（通过 stop_event），终止执行")
-                break
-            
-            check_stop = context.get("_check_stop")
-            if check_stop and callable(check_stop):
-                if check_stop():
-                    logger.info("检测到停止标志（通过检查函数），终止执行")
+        # 本波计划的步骤结果列表，开始时发布到 context 供占位符替换使用（之后原地追加）
+        context["step_results"] = step_results
+        self._active_context = context
+        is_stopped = _stop_checker(context)
+        
+        try:
+            for i, step in enumerate(plan):
+                # 🔴 CRITICAL: 检查停止标志（支持三种方式：stop_event、检查函数、直接标志）
+                if is_stopped():
+                    logger.info("检测到停止标志，终止执行")
                     break
-            elif context.get("_stop_execution", False):
-                logger.info("检测到停止标志（直接标志），终止执行")
-                break
-            
-            # 🔴 CRITICAL: 在执行步骤前，emit "executing" 事件更新进度
-            self.emit("executing", {
-                "step_index": i,
-                "total_steps": len(plan),
-                "current_step": i + 1,
-                "step_count": len(plan),
-                "description": step.get("description", step.get("action", "")),
-                "action": step.get("action", "")
-            })
-                
-            self.emit("step_started", {
-                "step_index": i,
-                "total_steps": len(plan),
-                "step": step,
-                "action": step.get("action", "")
-            })
-            
-            # 执行单步（包含重试逻辑）
-            step_result = self._execute_step_with_retry(step, i, max_attempts, context)
-            
-            # 🔴 CRITICAL: 步骤执行后立即检查停止标志（可能在步骤执行期间被设置）
-            import threading
-            stop_event = context.get("_stop_event")
-            if stop_event and isinstance(stop_event, threading.Event) and stop_event.is_set():
-                logger.info(f"步骤 {i} 执行后检测到停止标志，终止执行")
-                step_result = {
-                    "success": False,
-                    "message": "任务已取消",
-                    "data": None
-                }
-            
-            step_result_record = {
-                "step": step,
-                "result": step_result
-            }
-            step_results.append(step_result_record)
-            # 更新 context 中的 step_results 供占位符替换使用
-            context["step_results"] = step_results
-            
-            # 🔴 CRITICAL: 再次检查停止标志（在检查步骤结果前）
-            if stop_event and isinstance(stop_event, threading.Event) and stop_event.is_set():
-                logger.info("检测到停止标志，终止执行")
-                break
             
-            if step_result.get("success"):
-                self.emit("step_completed", {
+                # 🔴 CRITICAL: 在执行步骤前，emit "executing" 事件更新进度
+                self.emit("executing", {
                     "step_index": i,
                     "total_steps": len(plan),
-                    "step": step,
-                    "result": step_result,
-                    "status": "success"
+                    "current_step": i + 1,
+                    "step_count": len(plan),
+                    "description": step.get("description", step.get("action", "")),
+                    "action": step.get("action", "")
                 })
-            else:
-                overall_success = False
-                failed_reason = step_result.get("message", "Unknown error")
-                self.emit("step_failed", {
+                
+                self.emit("step_started", {
                     "step_index": i,
                     "total_steps": len(plan),
                     "step": step,
-                    "result": step_result,
-                    "error": failed_reason,
-                    "status": "failed"
+                    "action": step.get("action", "")
                 })
-                break
-                
+            
+                # 执行单步（包含重试逻辑）
+                step_result = self._execute_step_with_retry(step, i, max_attempts, context)
+            
+                # 🔴 CRITICAL: 步骤执行后立即检查停止标志（可能在步骤执行期间被设置）
+                stopped = is_stopped()
+                if stopped:
+                    logger.info(f"步骤 {i} 执行后检测到停止标志，终止执行")
+                    step_result = {
+                        "success": False,
+                        "message": "任务已取消",
+                        "data": None
+                    }
+            
+                step_result_record = {
+                    "step": step,
+                    "result": step_result
+                }
+                step_results.append(step_result_record)
+            
+                # 🔴 CRITICAL: 步骤期间已停止，不再处理步骤结果
+                if stopped:
+                    logger.info("检测到停止标志，终止执行")
+                    break
+            
+                if step_result.get("success"):
+                    self.emit("step_completed", {
+                        "step_index": i,
+                        "total_steps": len(plan),
+                        "step": step,
+                        "result": step_result,
+                        "status": "success"
+                    })
+                else:
+                    overall_success = False
+                    failed_reason = step_result.get("message", "Unknown error")
+                    self.emit("step_failed", {
+                        "step_index": i,
+                        "total_steps": len(plan),
+                        "step": step,
+                        "result": step_result,
+                        "error": failed_reason,
+                        "status": "failed"
+                    })
+                    break
+        finally:
+            # 计划结束（含异常退出）时发出剩余事件
+            self._emit_batcher.flush()
+        
         return {
             "success": overall_success,
             "message": "执行完成" if overall_success else f"执行失败: {failed_reason}",
@@ -153,81 +439,173 @@ class PlanExecutor:
             "user_instruction": user_instruction
         }
     
-    def _register_executors(self):
+    async def execute_plan_async(
+        self,
+        plan: List[Dict[str, Any]],
+        user_instruction: str,
+        context: Dict[str, Any],
+        max_attempts: int = 3
+    ) -> Dict[str, Any]:
         """
-        注册执行器路由规则（替代硬编码列表）
+        execute_plan 的异步版本（供运行在事件循环中的调用方使用）
         
-        格式：{step_type: executor_name}
+        计划在工作线程中执行，敏感操作确认等待、重试退避和工具调用都不会阻塞事件循环；
+        确认结果仍通过 confirm_sensitive() 提交（可直接在事件循环中调用）。
+        协程被取消时设置停止标志，执行线程在下一个检查点退出。
         """
-        # 文件操作
-        file_ops = [
-            "file_create", "file_read", "file_write", "file_delete",
-            "file_rename", "file_move", "file_copy", "file_organize",
-            "file_classify", "file_batch_rename", "file_batch_copy",
-            "file_batch_organize", "create_file", "read_file", 
-            "list_dir", "delete_file"
-        ]
-        for op in file_ops:
-            self.executor_registry[op] = "file_manager"
-        
-        # 浏览器操作
-        browser_ops = [
-            "browser_navigate", "browser_click", "browser_fill", "browser_wait",
-            "browser_screenshot", "browser_check_element", "download_file",
-            "request_login", "request_captcha", "request_qr_login",
-            "open_url", "click", "type", "scroll", "scrape", "screenshot_web"
-        ]
-        for op in browser_ops:
-            self.executor_registry[op] = "browser_executor"
-        
-        # 系统操作
-        system_ops = [
-            "screenshot_desktop", "open_app", "close_app", "set_volume", 
-            "set_brightness", "get_system_info", "open_folder", "open_file", 
-            "text_process", "python_script", "python", "code_interpreter"
-        ]
-        for op in system_ops:
-            self.executor_registry[op] = "system_tools"
-        
-        # 邮件操作
-        email_ops = [
-            "send_email", "search_emails", "get_email_details", 
-            "download_attachments", "manage_emails", "compress_files"
-        ]
-        for op in email_ops:
-            self.executor_registry[op] = "email_executor"
-        
-        logger.debug(f"[SECURITY_SHIELD] 执行器注册完成，共 {len(self.executor_registry)} 个路由规则")
-
+        stop_event = context.get("_stop_event")
+        if not isinstance(stop_event, threading.Event):
+            stop_event = context["_stop_event"] = threading.Event()
+        
+        try:
+            return await asyncio.to_thread(self.execute_plan, plan, user_instruction, context, max_attempts)
+        except asyncio.CancelledError:
+            stop_event.set()
+            raise
+    
+    def confirm_sensitive(self, step_index: int, confirmed: bool, context: Optional[Dict[str, Any]] = None):
+        """
+        提交敏感操作的确认结果，并立即唤醒等待中的执行线程
+        
+        Args:
+            step_index: 步骤索引
+            confirmed: 用户是否允许执行
+            context: 执行上下文，默认使用当前正在执行的计划上下文
+        """
+        context = context if context is not None else self._active_context
+        if context is None:
+            logger.warning(f"[SECURITY_SHIELD] 没有正在执行的计划，忽略步骤 {step_index} 的确认结果")
+            return
+        context[f"_sensitive_confirmation_{step_index}"] = bool(confirmed)
+        event = context.get("_sensitive_confirmation_events", {}).get(step_index)
+        if event is not None:
+            event.set()
+    
+    def _wait_for_sensitive_confirmation(
+        self, step_index: int, context: Dict[str, Any], event: threading.Event, is_stopped: Callable[[], bool]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        等待敏感操作确认（Event 驱动，确认后立即返回）
+        
+        Returns:
+            None 表示已收到确认结果；否则为应直接返回的失败结果（超时或任务被停止）
+        """
+        confirmation_key = f"_sensitive_confirmation_{step_index}"
+        remaining = SENSITIVE_CONFIRM_TIMEOUT
+        while confirmation_key not in context and remaining > 0:
+            # 🔴 CRITICAL: 在等待确认期间检查停止标志
+            if is_stopped():
+                return {"success": False, "message": "任务已取消"}
+            
+            wait_time = min(_STOP_CHECK_INTERVAL, remaining)
+            event.wait(wait_time)
+            remaining -= wait_time
+        
+        if confirmation_key not in context:
+            logger.error("[SECURITY_SHIELD] 用户未在30秒内确认敏感操作，取消执行")
+            return {"success": False, "message": "用户未确认敏感操作，执行已取消"}
+        return None
+    
+    def _run_tool(self, func: Callable, *args: Any, context: Dict[str, Any]) -> Any:
+        """
+        在常驻工具线程中执行工具调用，调用线程等待期间发送暂存事件并响应停止请求
+        
+        Raises:
+            TaskInterruptedException: 等待期间任务被停止（工具调用在工具线程中自行结束，
+                之后提交的工具调用排在它后面，不会与它并发；超过宽限期仍未结束则替换工具线程）
+        """
+        if threading.current_thread() is _TOOL_THREAD:
+            # 已在工具线程中（如工具内部嵌套执行计划），直接调用，避免自我等待死锁
+            return func(*args)
+        
+        # 在调用方的 contextvars 上下文中执行（如 emit 回调）
+        future = _get_tool_pool().submit(contextvars.copy_context().run, func, *args)
+        is_stopped = None
+        while True:
+            try:
+                return future.result(timeout=_STOP_CHECK_INTERVAL)
+            except FutureTimeoutError:
+                self._emit_batcher.flush()
+                if is_stopped is None:
+                    is_stopped = _stop_checker(context)
+                if is_stopped():
+                    _abandon_tool_call(future)
+                    raise TaskInterruptedException("任务已停止")
+    
+    @staticmethod
+    def _step_fields(step: Dict[str, Any]) -> Tuple[str, bool, str]:
+        """提取步骤的 (描述, 是否敏感操作, 类型)"""
+        description = step.get("description", "")
+        return description, description.startswith("[SENSITIVE]"), step.get("type", "")
+    
+    def _make_dispatcher(self, executor: Any) -> Callable[..., Dict[str, Any]]:
+        """
+        为执行器生成调度函数：入口方法在此绑定一次，调用时不再做入口探测和分支判断
+        
+        Returns:
+            dispatch(step_type, params, step, context) -> 执行结果
+        """
+        kind, method = self._resolve_exec_method(executor)
+        run_tool = self._run_tool
+        
+        # 2. FileManager Execution
+        if kind == "file":
+            def dispatch(step_type, params, step, context):
+                return run_tool(method, step_type, params, context, context=context)
+        
+        # 3. BrowserExecutor Execution
+        elif kind == "browser":
+            def dispatch(step_type, params, step, context):
+                return run_tool(method, step_type, params, context=context)
+        
+        # 4. Generic execute_step (Catch-all for SystemTools, EmailExecutor, etc.)
+        elif kind == "step":
+            def dispatch(step_type, params, step, context):
+                return run_tool(method, step, context, context=context)
+        
+        else:
+            def dispatch(step_type, params, step, context):
+                return {"success": False, "message": f"No execution method found on {executor}"}
+        
+        return dispatch
+    
+    @staticmethod
+    def _resolve_exec_method(executor: Any) -> Tuple[str, Optional[Callable]]:
+        """探测执行器的调用入口（按优先级：文件操作 > 浏览器动作 > 通用 execute_step）"""
+        for kind, name in _EXEC_METHOD_NAMES:
+            method = getattr(executor, name, None)
+            if method is not None:
+                return kind, method
+        return "none", None
+    
     def _execute_step_with_retry(self, step: Dict[str, Any], step_index: int, max_attempts: int, context: Dict[str, Any]) -> Dict[str, Any]:
         """执行单步，带重试机制"""
-        # 初始化 Reflector (延迟加载)
+        # 初始化 Reflector（每波计划首次执行步骤时按最新配置创建，之后复用）
         if self.reflector is None:
-            from agent.orchestrator.reflector import Reflector
             self.reflector = Reflector(self.config)
 
         current_step = step
         last_result = {"success": False, "message": "None"}
+        is_stopped = _stop_checker(context)
+        # 步骤描述/类型在重试间不变，只在 Reflector 替换步骤时重新提取
+        step_description, is_sensitive, step_type = self._step_fields(current_step)
 
         for attempt in range(1, max_attempts + 1):
             try:
-                # 🔴 CRITICAL: 在执行前检查停止标志（优先检查 stop_event）
-                import threading
-                stop_event = context.get("_stop_event")
-                if stop_event and isinstance(stop_event, threading.Event) and stop_event.is_set():
-                    logger.info(f"步骤 {step_index} 在执行前已被停止（通过 stop_event）")
-                    return {"success": False, "message": "任务已取消"}
-                
-                check_stop = context.get("_check_stop")
-                if check_stop and callable(check_stop) and check_stop():
-                    logger.info(f"步骤 {step_index} 在执行前已被停止（通过检查函数）")
+                # 🔴 CRITICAL: 在执行前检查停止标志
+                if is_stopped():
+                    logger.info(f"步骤 {step_index} 在执行前已被停止")
                     return {"success": False, "message": "任务已取消"}
                 
                 # === 敏感操作确认：检查步骤是否标记为 [SENSITIVE] ===
-                step_description = current_step.get("description", "")
-                if step_description.startswith("[SENSITIVE]"):
+                if is_sensitive:
                     logger.warning(f"[SECURITY_SHIELD] 步骤 {step_index} 标记为敏感操作，需要用户确认")
                     
+                    # 先登记等待事件再发送确认请求，避免确认先于等待到达时丢失唤醒
+                    confirmation_key = f"_sensitive_confirmation_{step_index}"
+                    confirm_events = context.setdefault("_sensitive_confirmation_events", {})
+                    confirm_event = confirm_events[step_index] = threading.Event()
+                    
                     # 通过 emit 发送确认请求
                     self.emit("sensitive_operation_detected", {
                         "step_index": step_index,
@@ -236,29 +614,18 @@ class PlanExecutor:
                         "message": f"检测到敏感操作：{step_description}\n\n此操作可能具有破坏性，是否继续执行？"
                     })
                     
-                    # 等待用户确认（通过 context 中的确认标志）
-                    # 注意：这里需要前端配合，通过 context 设置确认结果
-                    confirmation_key = f"_sensitive_confirmation_{step_index}"
-                    if confirmation_key not in context:
-                        # 如果没有确认结果，等待用户响应（最多等待30秒）
-                        import time
-                        import threading
-                        wait_start = time.time()
-                        while confirmation_key not in context and (time.time() - wait_start) < 30:
-                            # 🔴 CRITICAL: 在等待确认期间检查停止标志
-                            stop_event = context.get("_stop_event")
-                            if stop_event and isinstance(stop_event, threading.Event) and stop_event.is_set():
-                                return {"success": False, "message": "任务已取消"}
-                            
-                            check_stop = context.get("_check_stop")
-                            if check_stop and callable(check_stop) and check_stop():
-                                return {"success": False, "message": "任务已取消"}
-                            
-                            time.sleep(0.5)
-                        
+                    # 等待用户确认（前端通过 confirm_sensitive() 或 context 中的确认标志回传结果）
+                    self._emit_batcher.flush()
+                    try:
                         if confirmation_key not in context:
-                            logger.error("[SECURITY_SHIELD] 用户未在30秒内确认敏感操作，取消执行")
-                            return {"success": False, "message": "用户未确认敏感操作，执行已取消"}
+                            # 如果没有确认结果，等待用户响应（最多等待30秒）
+                            failure = self._wait_for_sensitive_confirmation(
+                                step_index, context, confirm_event, is_stopped
+                            )
+                            if failure:
+                                return failure
+                    finally:
+                        confirm_events.pop(step_index, None)
                     
                     # 检查确认结果
                     confirmed = context.get(confirmation_key, False)
@@ -268,7 +635,6 @@ class PlanExecutor:
                     else:
                         logger.info("[SECURITY_SHIELD] 用户已确认敏感操作，继续执行")
                 
-                step_type = current_step.get("type", "")
                 action = current_step.get("action", "").lower()
                 params = current_step.get("params", {})
                 
@@ -294,8 +660,7 @@ class PlanExecutor:
                             elif any(kw in action_lower for kw in ["down", "调小", "减小", "降低"]):
                                 params["action"] = "down"
                             else:
-                                import re
-                                numbers = re.findall(r'\d+', action)
+                                numbers = _INT_RE.findall(action)
                                 if numbers:
                                     level = int(numbers[0])
                                     if 0 <= level <= 100:
@@ -319,8 +684,7 @@ class PlanExecutor:
                             elif any(kw in action_lower for kw in ["down", "调暗", "调低", "降低"]):
                                 params["action"] = "down"
                             else:
-                                import re
-                                percent_match = re.search(r'(\d+)%', action)
+                                percent_match = _PERCENT_RE.search(action)
                                 if percent_match:
                                     percent = int(percent_match.group(1))
                                     if 0 <= percent <= 100:
@@ -328,7 +692,7 @@ class PlanExecutor:
                                     else:
                                         params["action"] = "up"
                                 else:
-                                    float_match = re.search(r'(\d+\.?\d*)', action)
+                                    float_match = _NUMBER_RE.search(action)
                                     if float_match:
                                         level = float(float_match.group(1))
                                         if 0.0 <= level <= 1.0:
@@ -360,13 +724,13 @@ class PlanExecutor:
                 if not executor:
                     return {"success": False, "message": f"未找到执行器: {step_type}"}
 
-                # 核心调度执行
+                # 核心调度执行（工具可能长时间阻塞，先把暂存事件发出去）
+                self._emit_batcher.flush()
                 try:
                     result = self._dispatch_execution(executor, current_step, context)
                     last_result = result
                 except Exception as e:
                     # 捕获 TaskInterruptedException 或其他中断异常
-                    from agent.tools.exceptions import TaskInterruptedException
                     if isinstance(e, TaskInterruptedException):
                         logger.info(f"步骤 {step_index} 执行被中断: {e}")
                         return {"success": False, "message": "任务已取消"}
@@ -374,7 +738,7 @@ class PlanExecutor:
                     raise
                 
                 # 执行后检查停止标志
-                if check_stop and callable(check_stop) and check_stop():
+                if is_stopped():
                     logger.info(f"步骤 {step_index} 在执行后检测到停止标志")
                     return {"success": False, "message": "任务已取消"}
                 
@@ -400,15 +764,24 @@ class PlanExecutor:
                 
                 if attempt < max_attempts:
                     self.emit("thinking", {"content": "步骤异常，正在分析修复方案...", "phase": "reflection"})
+                    self._emit_batcher.flush()
                     reflection = self.reflector.analyze_failure(current_step, error_msg, str(current_step.get("params", {})))
                     
                     if reflection.is_retryable and reflection.modified_step:
                         logger.info(f"Reflector 建议修复: {reflection.reason}")
                         current_step = reflection.modified_step
+                        step_description, is_sensitive, step_type = self._step_fields(current_step)
                         self.emit("thinking", {"content": f"应用修复: {reflection.reason}", "phase": "reflection_applied"})
-                    else:
+                    elif not reflection.is_retryable:
+                        # 不可恢复：原样重试也只会再次失败，直接返回本次结果
                         logger.info(f"Reflector 判断为不可恢复错误: {reflection.reason}")
-                        time.sleep(1)
+                        return result
+                    else:
+                        # 可重试但没有修复方案：退避后原样重试
+                        delay = min(_RETRY_BASE_DELAY * (2 ** (attempt - 1)), _RETRY_MAX_DELAY)
+                        logger.info(f"Reflector 未给出修复方案，{delay:.2f}s 后重试: {reflection.reason}")
+                        self._emit_batcher.flush()
+                        time.sleep(delay)
                 else:
                     return result
                     
@@ -420,12 +793,9 @@ class PlanExecutor:
                 # 构造占位符错误的上下文信息
                 placeholder_context = f"占位符替换失败: {e.placeholder}。请检查上一步的执行结果，确保返回了正确的数据。"
                 
-                # 强制触发 Reflector 分析
-                if self.reflector is None:
-                    from agent.orchestrator.reflector import Reflector
-                    self.reflector = Reflector(self.config)
-                
+                # 强制触发 Reflector 分析（实例已在方法入口创建）
                 self.emit("thinking", {"content": "占位符替换失败，正在重新分析上下文...", "phase": "placeholder_reflection"})
+                self._emit_batcher.flush()
                 reflection = self.reflector.analyze_failure(
                     current_step, 
                     str(e), 
@@ -435,6 +805,7 @@ class PlanExecutor:
                 if reflection.is_retryable and reflection.modified_step:
                     logger.info(f"[SECURITY_SHIELD] Reflector 建议修复占位符问题: {reflection.reason}")
                     current_step = reflection.modified_step
+                    step_description, is_sensitive, step_type = self._step_fields(current_step)
                     self.emit("thinking", {"content": f"应用修复: {reflection.reason}", "phase": "placeholder_fix_applied"})
                     # 继续重试
                     if attempt < max_attempts:
@@ -459,23 +830,16 @@ class PlanExecutor:
         Returns:
             执行器实例，如果未找到返回 None
         """
-        # 1. 优先使用注册表查找
-        executor_name = self.executor_registry.get(step_type)
-        if executor_name:
-            executor = self.tools.get(executor_name)
-            if executor:
-                return executor
-        
-        # 2. 兼容错误的类型名称（由 Reflector 错误生成）
-        file_related_error_types = ["file_manager", "FileManager", "file_operation"]
-        if step_type in file_related_error_types:
-            return self.tools.get("file_manager")
-        
-        # 3. 默认返回 system_tools
+        # 1. 注册表类型，以及兼容的错误类型名称（由 Reflector 错误生成），均已在初始化时解析
+        executor = self._executor_by_type.get(step_type)
+        if executor is not None:
+            return executor
+        
+        # 2. 默认返回 system_tools
         logger.warning(f"[SECURITY_SHIELD] 未注册的步骤类型: {step_type}，使用默认执行器 (system_tools)")
         return self.tools.get("system_tools")
 
-    def _replace_placeholders(self, params: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    def _replace_placeholders(self, params: Dict[str, Any], step_results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         替换占位符，如 {{step1.id}} 或 {{step1.result[0].id}}
         支持复杂路径和索引语法：
@@ -483,107 +847,42 @@ class PlanExecutor:
         - 支持 stepN.field[index] 格式
         - 支持 stepN.field1.field2[index].field3 等嵌套路径
         如果路径中任何一级不存在，返回 None（会被拦截逻辑识别为 NULL_ID）
+        调用方先用 _has_placeholder 判断，没有占位符时不调用（避免重建容器）
         """
-        import re
-        
-        def get_deep_value(obj: Any, path: str) -> Any:
-            """
-            根据路径获取深层值，支持索引语法
-            例如：result[0].id 或 data.emails[1].subject
-            """
-            if obj is None:
-                return None
-            
-            parts = path.split('.')
-            current = obj
+        def replace_match(match: re.Match) -> str:
+            """解析单个占位符，返回替换文本（取不到值时为 NULL_ID）"""
+            step_num = int(match.group(1))
+            path = match.group(2)
             
-            for part in parts:
-                if current is None:
-                    return None
+            # 从本波计划的步骤结果中取值
+            if step_num > 0 and step_num <= len(step_results):
+                step_result = step_results[step_num - 1]
+                step_data = step_result.get("result", {}).get("data", {})
                 
-                # 检查是否有索引，如 result[0] 或 emails[1]
-                match = re.match(r'(\w+)\[(\d+)\]', part)
-                if match:
-                    key, idx_str = match.groups()
-                    idx = int(idx_str)
-                    
-                    # 先获取对象（通过 key）
-                    if isinstance(current, dict):
-                        current = current.get(key)
-                    elif isinstance(current, list):
-                        # 如果 current 是列表，key 应该是数字索引
-                        try:
-                            current = current[int(key)]
-                        except (IndexError, ValueError, TypeError):
-                            return None
-                    else:
-                        return None
-                    
-                    # 再获取索引（通过 idx）
-                    if isinstance(current, (list, tuple)):
-                        try:
-                            current = current[idx]
-                        except (IndexError, TypeError):
-                            return None
-                    else:
-                        # 如果 current 不是列表/元组，说明路径错误
-                        return None
-                else:
-                    # 没有索引，直接获取属性
-                    if isinstance(current, dict):
-                        current = current.get(part)
-                    elif isinstance(current, (list, tuple)):
-                        # 如果 current 是列表/元组，part 应该是数字索引
-                        if part.isdigit():
-                            try:
-                                current = current[int(part)]
-                            except (IndexError, ValueError, TypeError):
-                                return None
-                        else:
-                            return None
-                    else:
-                        return None
+                # 按缓存的解析结果获取深层值
+                extracted_value = _deep_get(step_data, _parse_path(path))
+                
+                # 如果结果为 None，替换为 "NULL_ID"（脱敏日志）
+                if extracted_value is None:
+                    sanitized_path = LogSanitizer.sanitize_value(path, "")
+                    logger.warning(f"[SECURITY_SHIELD] 占位符 {{step{step_num}.{sanitized_path}}} 提取结果为 None，替换为 'NULL_ID'")
+                    return "NULL_ID"
+                return str(extracted_value)
             
-            return current
+            # 步骤不存在（脱敏日志）
+            sanitized_path = LogSanitizer.sanitize_value(path, "")
+            logger.warning(f"[SECURITY_SHIELD] 占位符 {{step{step_num}.{sanitized_path}}} 引用的步骤不存在，替换为 'NULL_ID'")
+            return "NULL_ID"
         
         def replace_value(value: Any) -> Any:
             """递归替换值中的占位符"""
             if isinstance(value, str):
-                # 查找 {{stepN.path}} 格式的占位符，支持复杂路径
+                # 绝大多数参数是普通字符串，没有 "{{" 时跳过正则扫描
+                if "{{" not in value:
+                    return value
+                # 单次扫描替换 {{stepN.path}} 格式的占位符，支持复杂路径
                 # 例如：{{step1.id}} 或 {{step1.result[0].id}} 或 {{step1.data.emails[1].subject}}
-                pattern = r'\{\{step(\d+)\.([^}]+)\}\}'
-                matches = re.findall(pattern, value)
-                
-                if matches:
-                    for step_num_str, path in matches:
-                        step_num = int(step_num_str)
-                        
-                        # 从 context 中获取步骤结果
-                        step_results = context.get("step_results", [])
-                        if step_num > 0 and step_num <= len(step_results):
-                            step_result = step_results[step_num - 1]
-                            step_data = step_result.get("result", {}).get("data", {})
-                            
-                            # 使用 get_deep_value 获取深层值
-                            extracted_value = get_deep_value(step_data, path)
-                            
-                            # 如果结果为 None，替换为 "NULL_ID"（脱敏日志）
-                            if extracted_value is None:
-                                sanitized_path = LogSanitizer.sanitize_value(path, "")
-                                logger.warning(f"[SECURITY_SHIELD] 占位符 {{step{step_num}.{sanitized_path}}} 提取结果为 None，替换为 'NULL_ID'")
-                                extracted_value = "NULL_ID"
-                            
-                            # 替换占位符
-                            placeholder = f"{{{{step{step_num}.{path}}}}}"
-                            value = value.replace(placeholder, str(extracted_value))
-                        else:
-                            # 步骤不存在（脱敏日志）
-                            sanitized_path = LogSanitizer.sanitize_value(path, "")
-                            logger.warning(f"[SECURITY_SHIELD] 占位符 {{step{step_num}.{sanitized_path}}} 引用的步骤不存在，替换为 'NULL_ID'")
-                            placeholder = f"{{{{step{step_num}.{path}}}}}"
-                            value = value.replace(placeholder, "NULL_ID")
-                
-                return value
+                return _PLACEHOLDER_RE.sub(replace_match, value)
             elif isinstance(value, dict):
                 return {k: replace_value(v) for k, v in value.items()}
             elif isinstance(value, list):
@@ -604,69 +903,45 @@ class PlanExecutor:
         step_type = step.get("type", "")
         params = step.get("params", {})
         
-        # 替换占位符（如 {{step1.id}}）
-        params = self._replace_placeholders(params, context)
+        # 替换占位符（如 {{step1.id}}）；没有占位符时跳过替换，不重建参数
+        if _has_placeholder(params):
+            params = self._replace_placeholders(params, context.get("step_results", []))
         step["params"] = params  # 更新 step 中的 params
         
         # === 增强占位符防御：检测 NULL_ID ===
-        def check_null_id(obj: Any, path: str = "") -> List[str]:
-            """递归检查对象中是否包含 NULL_ID"""
-            null_ids = []
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    current_path = f"{path}.{key}" if path else key
-                    if isinstance(value, str) and value == "NULL_ID":
-                        null_ids.append(current_path)
-                    elif isinstance(value, (dict, list)):
-                        null_ids.extend(check_null_id(value, current_path))
-            elif isinstance(obj, list):
-                for idx, item in enumerate(obj):
-                    current_path = f"{path}[{idx}]" if path else f"[{idx}]"
-                    if isinstance(item, str) and item == "NULL_ID":
-                        null_ids.append(current_path)
-                    elif isinstance(item, (dict, list)):
-                        null_ids.extend(check_null_id(item, current_path))
-            elif isinstance(obj, str) and obj == "NULL_ID":
-                null_ids.append(path if path else "root")
-            return null_ids
-        
-        null_id_paths = check_null_id(params)
-        if null_id_paths:
+        # 始终检查最终参数：NULL_ID 会随 step["params"] 传给 Reflector，修复后的步骤（或缓存结果）可能原样带回
+        null_id_path = _find_null_id(params)
+        if null_id_path:
             # 发现 NULL_ID，抛出 PlaceholderError 触发 Reflector 重新分析
-            error_msg = f"[SECURITY_SHIELD] 占位符替换失败，检测到 NULL_ID 在以下路径: {', '.join(null_id_paths)}"
+            error_msg = f"[SECURITY_SHIELD] 占位符替换失败，检测到 NULL_ID 在以下路径: {null_id_path}"
             logger.error(error_msg)
             raise PlaceholderError(
                 message=error_msg,
-                placeholder=", ".join(null_id_paths),
+                placeholder=null_id_path,
                 step=step
             )
         
-        # === 日志脱敏：打印参数时自动脱敏敏感信息 ===
-        sanitized_params = LogSanitizer.sanitize_dict(params)
-        logger.debug(f"[SECURITY_SHIELD] 执行步骤参数（已脱敏）: {LogSanitizer.sanitize_log_message(str(sanitized_params), sanitized_params)}")
+        # === 日志脱敏：打印参数时自动脱敏敏感信息（DEBUG 未开启时跳过脱敏和格式化）===
+        if logger.isEnabledFor(logging.DEBUG):
+            sanitized_params = LogSanitizer.sanitize_dict(params)
+            logger.debug(f"[SECURITY_SHIELD] 执行步骤参数（已脱敏）: {LogSanitizer.sanitize_log_message(str(sanitized_params), sanitized_params)}")
         
         action = step.get("action", "").lower()
         
-        # 错误类型修复：如果 Reflector 生成了错误的类型，尝试修复
-        if step_type in ["file_manager", "FileManager", "file_operation"]:
-            # 根据 action 推断正确的类型
-            if "delete" in action or "删除" in action:
-                step_type = "file_delete"
-                step["type"] = "file_delete"
-                logger.warning(f"🔧 修复错误类型: {step.get('type')} → file_delete")
-            elif "read" in action or "读取" in action:
-                step_type = "file_read"
-                step["type"] = "file_read"
-            elif "write" in action or "写入" in action:
-                step_type = "file_write"
-                step["type"] = "file_write"
-            else:
-                step_type = "file_delete"  # 默认
-                step["type"] = "file_delete"
+        # 错误类型修复：如果 Reflector 生成了错误的类型，尝试根据 action 推断正确的类型
+        if step_type in _FILE_RELATED_ERROR_TYPES:
+            repaired_type = next(
+                (file_type for pattern, file_type in _ACTION_TYPE_MAP if pattern.search(action)),
+                "file_delete"  # 默认
+            )
+            if repaired_type == "file_delete":
+                logger.warning(f"🔧 修复错误类型: {step_type} → file_delete")
+            step_type = repaired_type
+            step["type"] = repaired_type
         
         if step_type == "app_control":
             # app_control 应该根据 action 转换为 open_app 或 close_app
-            if "close" in action or "关闭" in action:
+            if _APP_CONTROL_CLOSE_RE.search(action):
                 step_type = "close_app"
                 step["type"] = "close_app"
                 logger.warning("🔧 修复错误类型: app_control → close_app")
@@ -693,8 +968,7 @@ class PlanExecutor:
                         params["action"] = "down"
                     else:
                         # 尝试提取数字
-                        import re
-                        numbers = re.findall(r'\d+', action)
+                        numbers = _INT_RE.findall(action)
                         if numbers:
                             level = int(numbers[0])
                             if 0 <= level <= 100:
@@ -719,8 +993,7 @@ class PlanExecutor:
                         params["action"] = "down"
                     else:
                         # 尝试提取百分比或小数
-                        import re
-                        percent_match = re.search(r'(\d+)%', action)
+                        percent_match = _PERCENT_RE.search(action)
                         if percent_match:
                             percent = int(percent_match.group(1))
                             if 0 <= percent <= 100:
@@ -728,7 +1001,7 @@ class PlanExecutor:
                             else:
                                 params["action"] = "up"
                         else:
-                            float_match = re.search(r'(\d+\.?\d*)', action)
+                            float_match = _NUMBER_RE.search(action)
                             if float_match:
                                 level = float(float_match.group(1))
                                 if 0.0 <= level <= 1.0:
@@ -754,10 +1027,10 @@ class PlanExecutor:
                 logger.warning(f"🔧 修复错误类型: system_control → get_system_info (默认)")
         
         # 1. Python Code Execution
-        if step_type in ["python_script", "python"]:
+        if step_type in _PYTHON_STEP_TYPES:
             code = params.get("code", "")
             if hasattr(executor, "code_interpreter"):
-                res = executor.code_interpreter.execute(code)
+                res = self._run_tool(executor.code_interpreter.execute, code, context=context)
                 if hasattr(res, "success"): 
                     return {
                         "success": res.success,
@@ -770,16 +1043,6 @@ class PlanExecutor:
                     return res
             return {"success": False, "message": "CodeInterpreter不可用"}
             
-        # 2. FileManager Execution
-        if hasattr(executor, "execute_file_operation"):
-             return executor.execute_file_operation(step_type, params, context)
-             
-        # 3. BrowserExecutor Execution
-        if hasattr(executor, "execute_browser_action"):
-            return executor.execute_browser_action(step_type, params)
-            
-        # 4. Generic execute_step (Catch-all for SystemTools, EmailExecutor, etc.)
-        if hasattr(executor, "execute_step"):
-            return executor.execute_step(step, context)
-
-        return {"success": False, "message": f"No execution method found on {executor}"}
+        # 2-4. 调用初始化时生成的调度函数（不在工具映射中的执行器现场生成，不缓存：id 可能被复用）
+        dispatch = self._dispatchers.get(id(executor)) or self._make_dispatcher(executor)
+        return dispatch(step_type, params, step, context)
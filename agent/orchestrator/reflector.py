@@ -8,10 +8,18 @@ Responsibility:
 - Visual Grounding: Use screenshots to locate elements when selectors fail
 """
 
+import asyncio
 import logging
 import json
 import base64
-from typing import Dict, Any, Optional, List
+import hashlib
+import io
+import re
+import threading
+import time
+import concurrent.futures
+from collections import OrderedDict
+from typing import Dict, Any, Coroutine, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 from openai import OpenAI
@@ -19,6 +27,244 @@ from agent.tools.config import Config
 
 logger = logging.getLogger(__name__)
 
+# 异步 LLM 调用的超时时间（秒）
+_LLM_TIMEOUT = 60.0
+
+_SYSTEM_PROMPT = "You are an expert Python Debugger and Agentic Planner. Your goal is to fix failed automation steps. Respond ONLY with a JSON object."
+
+# 固定的修复规则说明：放在 system 中且不插入任何动态内容，保证前缀在各次调用间完全一致，
+# 以命中 Claude 的 prompt caching（cache_control）和 OpenAI/DeepSeek 的自动前缀缓存
+_STATIC_INSTRUCTIONS = """
+**Instructions**:
+1. Analyze why the step failed (e.g., SyntaxError, FileNotFoundError, Invalid Parameter, ElementNotFound).
+2. If the error is specific to Python script content (e.g., SyntaxError, missing import), rewrite the 'code' or 'script' parameter in the `modified_step`.
+3. If the path was wrong, try to correct it based on common conventions or safety rules (e.g. use `~/Desktop`).
+4. **For browser errors with selectors**: If you have a screenshot, analyze it visually to find the correct selector or use coordinates.
+5. **Important**: Return a JSON object with the following structure:
+{
+    "is_retryable": boolean,      // Can we try again with a fix?
+    "reason": "string",           // Brief explanation of the fix
+    "modified_step": object|null  // The complete, corrected step object (or null if not retryable)
+}
+
+**Rules for Fixes**:
+- If it's a Python Syntax Error, fix the code.
+- If it's a "File Not Found" for a screenshot/download, ensure the path exists or use a more robust path.
+- If it's a browser selector error and you have a screenshot, analyze the screenshot to find the correct selector or coordinates.
+- Keep the `type` of the step the same unless the tool itself was wrong.
+- **For coordinate-based fixes**: You can change `browser_fill` to `browser_click` + `keyboard_type` if the selector is unreliable.
+
+**NON-RETRYABLE ERRORS (Set is_retryable: false)**:
+These errors require **user configuration** and cannot be fixed by modifying the step:
+- **Configuration errors**: Missing API Key, wrong provider/model configuration (e.g., "DeepSeek 不支持视觉功能", "VLM不可用：未配置API Key")
+- **Missing dependencies**: Missing Python packages that require manual installation (e.g., "ddddocr 未安装", "pip install ddddocr")
+- **System requirements**: Missing system tools or permissions that require user action
+- **Invalid configuration**: Provider/model mismatch (e.g., using DeepSeek for vision tasks)
+
+**When you see these errors**:
+- Set `is_retryable: false`
+- Set `modified_step: null`
+- In `reason`, explain: "This error requires user configuration. [具体说明需要用户做什么]"
+
+**Examples of NON-RETRYABLE errors**:
+- "VLM不可用：DeepSeek 不支持视觉功能" → `is_retryable: false` (用户需要切换模型)
+- "OCR不可用：ddddocr 未安装" → `is_retryable: false` (用户需要安装依赖)
+- "视觉分析失败：VLM和OCR均不可用" + 包含配置建议 → `is_retryable: false` (用户需要配置)
+
+**CRITICAL: Parameter Extraction Rules**:
+- **NEVER use placeholders** like `[REPLACE_WITH_ACTUAL_APP_NAME]`, `extract_from_context_or_ask_user`, or any text containing `[ ]` brackets.
+- **ALWAYS extract real values** from the `Context` or `Failed Step`:
+  - If `app_name` is missing, extract it from the original instruction in Context (e.g., "打开汽水音乐" → "汽水音乐").
+  - If `file_path` is missing, extract it from Context or use safe defaults (e.g., `~/Desktop`).
+  - If you cannot find the real value in Context, set `is_retryable: false` and explain why.
+- **Forbidden patterns** (DO NOT USE):
+  - `[REPLACE_WITH_ACTUAL_APP_NAME]`
+  - `extract_from_context_or_ask_user`
+  - `[ANY_TEXT_IN_BRACKETS]`
+  - `placeholder`, `TODO`, `FIXME`
+- **If a required parameter is missing and cannot be extracted**:
+  - Set `is_retryable: false`
+  - In `reason`, explain: "Cannot extract [parameter_name] from context. User must provide it explicitly."
+- **Example of CORRECT fix**:
+  - Error: "缺少app_name参数"
+  - Context: "用户指令: 打开汽水音乐"
+  - Fix: `{"params": {"app_name": "汽水音乐"}}` ✅
+- **Example of WRONG fix**:
+  - Fix: `{"params": {"app_name": "[REPLACE_WITH_ACTUAL_APP_NAME]"}}` ❌
+"""
+
+_SYSTEM_INSTRUCTIONS = _SYSTEM_PROMPT + "\n" + _STATIC_INSTRUCTIONS
+
+# 从带前后说明文字的回复中提取 JSON 对象
+_JSON_OBJECT_RE = re.compile(r'(\{.*\})', re.DOTALL)
+
+# 反思结果缓存：同一步骤以同类错误再次失败时直接复用上次的分析结果，不再调用 LLM
+# {签名: (结果 JSON 文本, 过期时间)}，进程内 LRU（Reflector 每波计划重建，缓存放在模块级）
+_REFLECTION_CACHE_SIZE = 256
+_REFLECTION_CACHE: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_REFLECTION_CACHE_LOCK = threading.Lock()
+_RE_DIGITS = re.compile(r'\d+')
+# 需要用户修改配置的不可恢复错误：用户修复配置后应重新分析，不缓存
+_CONFIG_REASON_KEYWORDS = ("configuration", "配置")
+# 其他不可恢复结论（网络、页面状态等可能是暂时性的）只缓存一小段时间，过期后重新分析
+_NON_RETRYABLE_CACHE_TTL = 60.0
+# 可重试的修复方案缓存较长时间，过期后重新咨询模型
+_RETRYABLE_CACHE_TTL = 600.0
+# {修复后步骤的摘要: 产生它的缓存签名}：修复后的步骤再次失败时据此淘汰该缓存项
+_FIX_SOURCES: "OrderedDict[str, str]" = OrderedDict()
+
+# 常驻后台事件循环：所有异步 LLM 调用都在同一个循环中执行，
+# 异步客户端的 HTTP 连接池（keep-alive / TLS 会话）在多次调用之间得以复用
+_BG_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_BG_LOOP_LOCK = threading.Lock()
+
+# 进程内共享的异步客户端：{(提供商, base_url, api_key): 客户端}
+# Reflector 每波计划重建，客户端（及其连接池）不随实例创建/泄漏；只在后台循环中使用
+_ASYNC_CLIENTS: Dict[Tuple[str, Optional[str], str], Any] = {}
+_ASYNC_CLIENTS_LOCK = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """获取（首次调用时启动）常驻后台事件循环"""
+    global _BG_LOOP
+    if _BG_LOOP is None:
+        with _BG_LOOP_LOCK:
+            if _BG_LOOP is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="Reflector-Loop", daemon=True).start()
+                _BG_LOOP = loop
+    return _BG_LOOP
+
+
+def _shared_async_client(provider: str, api_key: str, base_url: Optional[str] = None) -> Any:
+    """获取（首次调用时创建）共享的异步客户端；缺少异步客户端实现时抛出 ImportError"""
+    key = (provider, base_url, api_key)
+    with _ASYNC_CLIENTS_LOCK:
+        client = _ASYNC_CLIENTS.get(key)
+        if client is None:
+            if provider == "claude":
+                from anthropic import AsyncAnthropic
+                client = AsyncAnthropic(api_key=api_key)
+            else:
+                from openai import AsyncOpenAI
+                client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+            _ASYNC_CLIENTS[key] = client
+        return client
+
+
+def _run_in_background_loop(coro: Coroutine[Any, Any, Any], timeout: float = _LLM_TIMEOUT) -> Any:
+    """在常驻后台事件循环中执行协程并同步等待结果（超时则取消协程）"""
+    future = asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+def _classify_error(error_message: str) -> str:
+    """
+    归一化错误消息：数字替换为 #，使行号/计数不同的同类错误得到相同签名
+    
+    Python 回溯取最后一行（异常类型与消息），其他错误取首行。
+    """
+    lines = error_message.strip().splitlines() or [""]
+    line = lines[-1] if lines[0].startswith("Traceback") else lines[0]
+    return _RE_DIGITS.sub("#", line.lower())[:200]
+
+
+def _step_digest(step: Any) -> str:
+    """步骤内容摘要（识别缓存给出的修复步骤是否再次失败）"""
+    payload = json.dumps(step, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _reflection_cache_key(model: str, step: Dict[str, Any], error_message: str, context_summary: str) -> str:
+    """计算反思缓存签名（完整步骤 + 错误类别 + 上下文）"""
+    payload = json.dumps(
+        {
+            "model": model,
+            "step": step,
+            "err_class": _classify_error(error_message),
+            "context": context_summary,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _evict_failed_fix(step: Dict[str, Any]):
+    """失败的步骤若正是缓存给出的修复方案，淘汰产生它的缓存项（该方案已被证明无效）"""
+    digest = _step_digest(step)
+    with _REFLECTION_CACHE_LOCK:
+        source_key = _FIX_SOURCES.pop(digest, None)
+        if source_key is not None:
+            _REFLECTION_CACHE.pop(source_key, None)
+
+
+def _get_cached_reflection(key: str) -> Optional[Dict[str, Any]]:
+    """查询反思缓存（每次返回新解析的对象，调用方修改 modified_step 不会影响缓存）"""
+    with _REFLECTION_CACHE_LOCK:
+        entry = _REFLECTION_CACHE.get(key)
+        if entry is None:
+            return None
+        cached, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del _REFLECTION_CACHE[key]
+            return None
+        _REFLECTION_CACHE.move_to_end(key)
+    return json.loads(cached)
+
+
+def _cache_reflection(key: str, result_json: Dict[str, Any]):
+    """写入反思缓存（需要用户修改配置的不可恢复结果不缓存，其余按是否可重试限时缓存）"""
+    modified_step = result_json.get("modified_step")
+    if result_json.get("is_retryable", False):
+        ttl = _RETRYABLE_CACHE_TTL
+    else:
+        reason = str(result_json.get("reason", "")).lower()
+        if any(keyword in reason for keyword in _CONFIG_REASON_KEYWORDS):
+            return
+        ttl = _NON_RETRYABLE_CACHE_TTL
+    cached = json.dumps(result_json, ensure_ascii=False)
+    fix_digest = _step_digest(modified_step) if modified_step else None
+    with _REFLECTION_CACHE_LOCK:
+        _REFLECTION_CACHE[key] = (cached, time.monotonic() + ttl)
+        _REFLECTION_CACHE.move_to_end(key)
+        while len(_REFLECTION_CACHE) > _REFLECTION_CACHE_SIZE:
+            _REFLECTION_CACHE.popitem(last=False)
+        if fix_digest is not None:
+            _FIX_SOURCES[fix_digest] = key
+            _FIX_SOURCES.move_to_end(fix_digest)
+            while len(_FIX_SOURCES) > _REFLECTION_CACHE_SIZE:
+                _FIX_SOURCES.popitem(last=False)
+
+
+def _has_image(request: Dict[str, Any]) -> bool:
+    """LLM 请求中是否附带了截图"""
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list) and any(
+            isinstance(part, dict) and part.get("type") in ("image", "image_url") for part in content
+        ):
+            return True
+    return False
+
+
+async def _await_in_background_loop(coro: Coroutine[Any, Any, Any], timeout: float = _LLM_TIMEOUT) -> Any:
+    """在常驻后台事件循环中执行协程，由调用方所在的事件循环异步等待结果"""
+    loop = _get_background_loop()
+    if asyncio.get_running_loop() is loop:
+        return await asyncio.wait_for(coro, timeout)
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        future.cancel()
+        raise
+
 @dataclass
 class ReflectorResult:
     is_retryable: bool
@@ -41,7 +287,6 @@ class Reflector:
         self.model = config.model
         self.sandbox_path = Path(config.sandbox_path).resolve()
         self.use_async = use_async
-        self._temp_files: List[Path] = []  # 跟踪临时文件，用于清理
         
         api_key = config.api_key
         logger.info(f"Reflector: config.provider='{config.provider}', config.api_key exists={'Yes' if api_key else 'No'}, use_async={use_async}")
@@ -60,8 +305,7 @@ class Reflector:
                 # 尝试初始化异步客户端
                 if use_async:
                     try:
-                        from anthropic import AsyncAnthropic
-                        self.async_client = AsyncAnthropic(api_key=api_key)
+                        self.async_client = _shared_async_client("claude", api_key)
                         logger.info("✅ Reflector 异步客户端已初始化 (AsyncAnthropic)")
                     except ImportError:
                         logger.warning("⚠️ AsyncAnthropic 不可用，将使用同步客户端")
@@ -72,8 +316,7 @@ class Reflector:
                 # 尝试初始化异步客户端
                 if use_async:
                     try:
-                        from openai import AsyncOpenAI
-                        self.async_client = AsyncOpenAI(api_key=api_key, base_url="https://api.deepseek.com")
+                        self.async_client = _shared_async_client("deepseek", api_key, "https://api.deepseek.com")
                         logger.info("✅ Reflector 异步客户端已初始化 (AsyncOpenAI)")
                     except ImportError:
                         logger.warning("⚠️ AsyncOpenAI 不可用，将使用同步客户端")
@@ -83,8 +326,7 @@ class Reflector:
                 
                 if use_async:
                     try:
-                        from openai import AsyncOpenAI
-                        self.async_client = AsyncOpenAI(api_key=api_key, base_url="https://api.x.ai/v1")
+                        self.async_client = _shared_async_client("grok", api_key, "https://api.x.ai/v1")
                         logger.info("✅ Reflector 异步客户端已初始化 (AsyncOpenAI)")
                     except ImportError:
                         logger.warning("⚠️ AsyncOpenAI 不可用，将使用同步客户端")
@@ -95,8 +337,7 @@ class Reflector:
                 
                 if use_async:
                     try:
-                        from openai import AsyncOpenAI
-                        self.async_client = AsyncOpenAI(api_key=api_key)
+                        self.async_client = _shared_async_client("openai", api_key)
                         logger.info("✅ Reflector 异步客户端已初始化 (AsyncOpenAI)")
                     except ImportError:
                         logger.warning("⚠️ AsyncOpenAI 不可用，将使用同步客户端")
@@ -128,6 +369,86 @@ class Reflector:
 
         logger.info(f"Reflector process started for step: {step.get('action')}")
         
+        cache_key, cached = self._lookup_reflection(step, error_message, context_summary)
+        if cached is not None:
+            return cached
+        
+        try:
+            request = self._build_llm_request(step, error_message, context_summary)
+            
+            # 使用真正的异步客户端（如果可用）
+            if self.async_client:
+                try:
+                    logger.info("[SECURITY_SHIELD] 使用异步客户端调用 LLM API（真正的 async/await）")
+                    # 在常驻后台事件循环中执行（复用连接池，不再每次新建事件循环）
+                    content = _run_in_background_loop(self._call_llm_async(request))
+                except Exception as e:
+                    logger.warning(f"[SECURITY_SHIELD] 异步调用失败，降级到同步调用: {e}")
+                    content = self._call_llm_sync(request)
+            else:
+                # 使用同步客户端
+                content = self._call_llm_sync(request)
+            
+            result_json = self._parse_reflection(content)
+            if not _has_image(request):
+                # 带截图的分析依赖当时的页面画面，签名里不含截图，不缓存
+                _cache_reflection(cache_key, result_json)
+            return self._to_result(result_json)
+        except Exception as e:
+            logger.error(f"Reflector analysis failed: {e}", exc_info=True)
+            return ReflectorResult(False, None, f"Reflector Error: {e}")
+
+    async def analyze_failure_async(
+        self,
+        step: Dict[str, Any],
+        error_message: str,
+        context_summary: str = ""
+    ) -> ReflectorResult:
+        """
+        analyze_failure 的异步版本，供已运行在事件循环中的调用方直接 await
+        
+        多个失败步骤可以通过 asyncio.gather 并发分析。LLM 调用仍在常驻后台事件循环中执行
+        （异步客户端的连接池绑定在该循环上），调用方只等待结果，不占用线程；
+        截图读取/压缩和同步降级调用放到工作线程中执行。
+        """
+        if not self.client:
+            return ReflectorResult(False, None, "Reflector not configured (No API Key)")
+
+        logger.info(f"Reflector process started for step: {step.get('action')}")
+        
+        cache_key, cached = self._lookup_reflection(step, error_message, context_summary)
+        if cached is not None:
+            return cached
+        
+        try:
+            request = await asyncio.to_thread(self._build_llm_request, step, error_message, context_summary)
+            
+            if self.async_client:
+                try:
+                    logger.info("[SECURITY_SHIELD] 使用异步客户端调用 LLM API（真正的 async/await）")
+                    content = await _await_in_background_loop(self._call_llm_async(request))
+                except Exception as e:
+                    logger.warning(f"[SECURITY_SHIELD] 异步调用失败，降级到同步调用: {e}")
+                    content = await asyncio.to_thread(self._call_llm_sync, request)
+            else:
+                content = await asyncio.to_thread(self._call_llm_sync, request)
+            
+            result_json = self._parse_reflection(content)
+            if not _has_image(request):
+                # 带截图的分析依赖当时的页面画面，签名里不含截图，不缓存
+                _cache_reflection(cache_key, result_json)
+            return self._to_result(result_json)
+        except Exception as e:
+            logger.error(f"Reflector analysis failed: {e}", exc_info=True)
+            return ReflectorResult(False, None, f"Reflector Error: {e}")
+
+    def _build_llm_request(self, step: Dict[str, Any], error_message: str, context_summary: str) -> Dict[str, Any]:
+        """
+        构建 LLM 请求参数（含视觉定位截图），同步/异步客户端共用
+        
+        Returns:
+            对应 provider 的 create() 关键字参数（Claude: messages.create；其他: chat.completions.create）
+        """
         # === 新增：视觉定位（Visual Grounding）===
         # 检测浏览器错误，查找错误截图
         screenshot_data = None
@@ -152,182 +473,123 @@ class Reflector:
         
         prompt = self._build_reflection_prompt(step, error_message, context_summary, screenshot_data, screenshot_info)
         
-        try:
-            if self.provider == "claude":
-                # Anthropic API call (supports vision)
-                messages = [{"role": "user", "content": []}]
-                
-                # 添加文本内容
-                messages[0]["content"].append({"type": "text", "text": prompt})
-                
-                # 如果有截图，添加图片（Claude支持多模态）
-                if screenshot_data:
-                    messages[0]["content"].append({
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/png",
-                            "data": screenshot_data
-                        }
-                    })
-                    logger.info("📸 已添加截图到Claude API请求（多模态分析）")
-                
-                # 使用真正的异步客户端（如果可用）
-                if self.async_client:
-                    try:
-                        import asyncio
-                        logger.info("[SECURITY_SHIELD] 使用异步客户端调用 Claude API（真正的 async/await）")
-                        
-                        async def call_claude():
-                            response = await self.async_client.messages.create(
-                                model=self.model,
-                                max_tokens=4000,
-                                system="You are an expert Python Debugger and Agentic Planner. Your goal is to fix failed automation steps. Respond ONLY with a JSON object.",
-                                messages=messages,
-                                temperature=0.1,
-                            )
-                            return response
-                        
-                        # 运行异步调用（如果已有事件循环，使用它；否则创建新的）
-                        try:
-                            loop = asyncio.get_event_loop()
-                            if loop.is_running():
-                                # 事件循环已在运行，使用线程池执行
-                                import concurrent.futures
-                                with concurrent.futures.ThreadPoolExecutor() as executor:
-                                    future = executor.submit(asyncio.run, call_claude())
-                                    response = future.result(timeout=60.0)
-                            else:
-                                response = loop.run_until_complete(call_claude())
-                        except RuntimeError:
-                            # 没有事件循环，创建新的
-                            response = asyncio.run(call_claude())
-                        
-                        content = response.content[0].text
-                    except Exception as e:
-                        logger.warning(f"[SECURITY_SHIELD] 异步调用失败，降级到同步调用: {e}")
-                        # 降级到同步调用
-                        response = self.client.messages.create(
-                            model=self.model,
-                            max_tokens=4000,
-                            system="You are an expert Python Debugger and Agentic Planner. Your goal is to fix failed automation steps. Respond ONLY with a JSON object.",
-                            messages=messages,
-                            temperature=0.1,
-                        )
-                        content = response.content[0].text
-                else:
-                    # 使用同步客户端
-                    response = self.client.messages.create(
-                        model=self.model,
-                        max_tokens=4000,
-                        system="You are an expert Python Debugger and Agentic Planner. Your goal is to fix failed automation steps. Respond ONLY with a JSON object.",
-                        messages=messages,
-                        temperature=0.1,
-                    )
-                    content = response.content[0].text
-            else:
-                # OpenAI / DeepSeek / Grok API call
-                messages = [
-                    {"role": "system", "content": "You are an expert Python Debugger and Agentic Planner. Your goal is to fix failed automation steps. Respond ONLY with a JSON object."},
-                ]
-                
-                # 构建用户消息（支持多模态）
-                user_content = []
-                user_content.append({"type": "text", "text": prompt})
-                
-                # 如果有截图，检查模型是否支持视觉
-                if screenshot_data:
-                    # DeepSeek-V3 和 OpenAI GPT-4V 支持视觉
-                    vision_models = ["deepseek-chat", "deepseek-v3", "gpt-4-vision", "gpt-4o", "gpt-4-turbo"]
-                    if any(vm in self.model.lower() for vm in vision_models):
-                        user_content.append({
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{screenshot_data}"
-                            }
-                        })
-                        logger.info(f"📸 已添加截图到API请求（{self.model}支持多模态）")
-                    else:
-                        # 如果不支持视觉，使用OCR提取文本和位置信息
-                        logger.info("⚠️ 模型不支持视觉，使用OCR提取文本信息")
-                        ocr_info = self._extract_ocr_info(screenshot_path)
-                        if ocr_info:
-                            prompt += f"\n\n**OCR提取的页面文本信息**:\n{ocr_info}"
-                
-                messages.append({"role": "user", "content": user_content})
-                
-                kwargs = {
-                    "model": self.model,
-                    "messages": messages,
-                    "temperature": 0.1,
-                }
-                
-                # DeepSeek and newer OpenAI models support JSON mode
-                if self.provider in ["openai", "deepseek"]:
-                    kwargs["response_format"] = {"type": "json_object"}
-                
-                # 使用真正的异步客户端（如果可用）
-                if self.async_client:
-                    try:
-                        import asyncio
-                        logger.info("[SECURITY_SHIELD] 使用异步客户端调用 LLM API（真正的 async/await）")
-                        
-                        async def call_llm():
-                            response = await self.async_client.chat.completions.create(**kwargs)
-                            return response
-                        
-                        # 运行异步调用
-                        try:
-                            loop = asyncio.get_event_loop()
-                            if loop.is_running():
-                                # 事件循环已在运行，使用线程池执行
-                                import concurrent.futures
-                                with concurrent.futures.ThreadPoolExecutor() as executor:
-                                    future = executor.submit(asyncio.run, call_llm())
-                                    response = future.result(timeout=60.0)
-                            else:
-                                response = loop.run_until_complete(call_llm())
-                        except RuntimeError:
-                            # 没有事件循环，创建新的
-                            response = asyncio.run(call_llm())
-                        
-                        content = response.choices[0].message.content
-                    except Exception as e:
-                        logger.warning(f"[SECURITY_SHIELD] 异步调用失败，降级到同步调用: {e}")
-                        # 降级到同步调用
-                        response = self.client.chat.completions.create(**kwargs)
-                        content = response.choices[0].message.content
-                else:
-                    # 使用同步客户端
-                    response = self.client.chat.completions.create(**kwargs)
-                    content = response.choices[0].message.content
-
-            # Parse JSON with fallback extraction
-            try:
-                result_json = json.loads(content)
-            except json.JSONDecodeError:
-                # Manual extraction if AI included preamble/postamble
-                import re
-                match = re.search(r'(\{.*\})', content, re.DOTALL)
-                if match:
-                    result_json = json.loads(match.group(1))
-                else:
-                    raise
-            
-            # 清理临时文件
-            self._cleanup_temp_files()
+        if self.provider == "claude":
+            # Anthropic API call (supports vision)
+            content = [{"type": "text", "text": prompt}]
             
-            return ReflectorResult(
-                is_retryable=result_json.get("is_retryable", False),
-                modified_step=result_json.get("modified_step"),
-                reason=result_json.get("reason", "No reason provided")
-            )
+            # 如果有截图，添加图片（Claude支持多模态）
+            if screenshot_data:
+                content.append({
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": "image/png",
+                        "data": screenshot_data
+                    }
+                })
+                logger.info("📸 已添加截图到Claude API请求（多模态分析）")
             
-        except Exception as e:
-            logger.error(f"Reflector analysis failed: {e}", exc_info=True)
-            # 即使失败也要清理临时文件
-            self._cleanup_temp_files()
-            return ReflectorResult(False, None, f"Reflector Error: {e}")
+            return {
+                "model": self.model,
+                "max_tokens": 4000,
+                "system": [{
+                    "type": "text",
+                    "text": _SYSTEM_INSTRUCTIONS,
+                    "cache_control": {"type": "ephemeral"},
+                }],
+                "messages": [{"role": "user", "content": content}],
+                "temperature": 0.1,
+            }
+        
+        # OpenAI / DeepSeek / Grok API call
+        image_content = []
+        
+        # 如果有截图，检查模型是否支持视觉
+        if screenshot_data:
+            # DeepSeek-V3 和 OpenAI GPT-4V 支持视觉
+            vision_models = ["deepseek-chat", "deepseek-v3", "gpt-4-vision", "gpt-4o", "gpt-4-turbo"]
+            if any(vm in self.model.lower() for vm in vision_models):
+                image_content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/png;base64,{screenshot_data}"
+                    }
+                })
+                logger.info(f"📸 已添加截图到API请求（{self.model}支持多模态）")
+            else:
+                # 如果不支持视觉，使用OCR提取文本和位置信息
+                logger.info("⚠️ 模型不支持视觉，使用OCR提取文本信息")
+                ocr_info = self._extract_ocr_info(screenshot_path)
+                if ocr_info:
+                    prompt += f"\n\n**OCR提取的页面文本信息**:\n{ocr_info}"
+        
+        # 构建用户消息（支持多模态）
+        user_content = [{"type": "text", "text": prompt}] + image_content
+        
+        kwargs = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": _SYSTEM_INSTRUCTIONS},
+                {"role": "user", "content": user_content},
+            ],
+            "temperature": 0.1,
+        }
+        
+        # DeepSeek and newer OpenAI models support JSON mode
+        if self.provider in ["openai", "deepseek"]:
+            kwargs["response_format"] = {"type": "json_object"}
+        
+        return kwargs
+
+    async def _call_llm_async(self, request: Dict[str, Any]) -> str:
+        """通过异步客户端调用 LLM，返回文本内容"""
+        if self.provider == "claude":
+            response = await self.async_client.messages.create(**request)
+            return response.content[0].text
+        response = await self.async_client.chat.completions.create(**request)
+        return response.choices[0].message.content
+
+    def _call_llm_sync(self, request: Dict[str, Any]) -> str:
+        """通过同步客户端调用 LLM，返回文本内容"""
+        if self.provider == "claude":
+            response = self.client.messages.create(**request)
+            return response.content[0].text
+        response = self.client.chat.completions.create(**request)
+        return response.choices[0].message.content
+
+    def _lookup_reflection(
+        self, step: Dict[str, Any], error_message: str, context_summary: str
+    ) -> Tuple[str, Optional[ReflectorResult]]:
+        """计算缓存签名并查询缓存，返回 (签名, 命中的结果或 None)"""
+        _evict_failed_fix(step)
+        cache_key = _reflection_cache_key(self.model, step, error_message, context_summary)
+        cached = _get_cached_reflection(cache_key)
+        if cached is None:
+            return cache_key, None
+        logger.info("Reflector 命中缓存（相同步骤的同类错误），跳过 LLM 调用")
+        return cache_key, self._to_result(cached)
+
+    @staticmethod
+    def _to_result(result_json: Dict[str, Any]) -> ReflectorResult:
+        return ReflectorResult(
+            is_retryable=result_json.get("is_retryable", False),
+            modified_step=result_json.get("modified_step"),
+            reason=result_json.get("reason", "No reason provided")
+        )
+
+    @staticmethod
+    def _parse_reflection(content: str) -> Dict[str, Any]:
+        """解析 LLM 返回的 JSON（容忍前后附加说明文字）"""
+        try:
+            result_json = json.loads(content)
+        except json.JSONDecodeError:
+            # Manual extraction if AI included preamble/postamble
+            match = _JSON_OBJECT_RE.search(content)
+            if match:
+                result_json = json.loads(match.group(1))
+            else:
+                raise
+        return result_json
 
     def _find_latest_error_screenshot(self) -> Optional[Path]:
         """
@@ -391,8 +653,7 @@ class Reflector:
         
         优化功能：
         - 如果图片宽度超过 1920px，等比例缩放至 1920px 宽度内
-        - 使用适当的压缩率保存为临时文件，节省 Token 成本
-        - 自动清理临时文件
+        - 压缩后的 PNG 直接写入内存缓冲区编码，不经过临时文件
         
         Args:
             screenshot_path: 截图文件路径
@@ -400,7 +661,6 @@ class Reflector:
         Returns:
             Base64编码的图片数据，失败返回None
         """
-        temp_file = None
         try:
             from PIL import Image
             
@@ -408,91 +668,49 @@ class Reflector:
             with Image.open(screenshot_path) as img:
                 original_width, original_height = img.size
                 
-                # 如果宽度超过 1920px，进行缩放
-                if original_width > 1920:
-                    # 计算缩放比例（保持宽高比）
-                    scale_ratio = 1920 / original_width
-                    new_width = 1920
-                    new_height = int(original_height * scale_ratio)
-                    
-                    logger.info(f"[SECURITY_SHIELD] 图片尺寸过大 ({original_width}x{original_height})，缩放至 {new_width}x{new_height} 以节省 Token")
-                    
-                    # 缩放图片（使用高质量重采样）
-                    img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    
-                    # 创建临时文件保存压缩后的图片
-                    temp_dir = self.sandbox_path / "temp"
-                    temp_dir.mkdir(parents=True, exist_ok=True)
-                    
-                    temp_file = temp_dir / f"compressed_{screenshot_path.stem}.png"
-                    # 保存为 PNG（质量 85，平衡文件大小和质量）
-                    img_resized.save(temp_file, "PNG", optimize=True, compress_level=6)
-                    
-                    # 记录临时文件，用于后续清理
-                    self._temp_files.append(temp_file)
-                    
-                    # 读取压缩后的图片
-                    with open(temp_file, "rb") as f:
-                        image_bytes = f.read()
-                else:
-                    # 图片尺寸合适，直接读取
-                    with open(screenshot_path, "rb") as f:
-                        image_bytes = f.read()
+                # 图片尺寸合适，直接编码原文件
+                if original_width <= 1920:
+                    return base64.b64encode(screenshot_path.read_bytes()).decode("ascii")
                 
-                # Base64 编码
-                image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+                # 计算缩放比例（保持宽高比）
+                scale_ratio = 1920 / original_width
+                new_width = 1920
+                new_height = int(original_height * scale_ratio)
                 
-                # 记录优化效果
-                original_size = screenshot_path.stat().st_size
-                if temp_file:
-                    compressed_size = temp_file.stat().st_size
-                    reduction = (1 - compressed_size / original_size) * 100
-                    logger.info(f"[SECURITY_SHIELD] 图片压缩完成: {original_size / 1024:.1f}KB -> {compressed_size / 1024:.1f}KB (减少 {reduction:.1f}%)")
+                logger.info(f"[SECURITY_SHIELD] 图片尺寸过大 ({original_width}x{original_height})，缩放至 {new_width}x{new_height} 以节省 Token")
                 
-                return image_base64
+                # 缩放图片（使用高质量重采样）
+                img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            
+            # 压缩后的图片保存到内存缓冲区，直接对缓冲区内容做 Base64 编码（无额外拷贝）
+            buffer = io.BytesIO()
+            img_resized.save(buffer, "PNG", optimize=True, compress_level=6)
+            image_bytes = buffer.getbuffer()
+            image_base64 = base64.b64encode(image_bytes).decode("ascii")
+            
+            # 记录优化效果
+            original_size = screenshot_path.stat().st_size
+            compressed_size = image_bytes.nbytes
+            reduction = (1 - compressed_size / original_size) * 100
+            logger.info(f"[SECURITY_SHIELD] 图片压缩完成: {original_size / 1024:.1f}KB -> {compressed_size / 1024:.1f}KB (减少 {reduction:.1f}%)")
+            
+            return image_base64
         except ImportError:
             # PIL 不可用，降级到原始方法
             logger.warning("[SECURITY_SHIELD] PIL 不可用，跳过图片预处理")
             try:
-                with open(screenshot_path, "rb") as f:
-                    image_bytes = f.read()
-                image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-                return image_base64
+                return base64.b64encode(screenshot_path.read_bytes()).decode("ascii")
             except Exception as e:
                 logger.warning(f"编码截图失败: {e}")
                 return None
         except Exception as e:
             logger.warning(f"[SECURITY_SHIELD] 图片预处理失败: {e}，降级到原始方法")
             try:
-                with open(screenshot_path, "rb") as f:
-                    image_bytes = f.read()
-                image_base64 = base64.b64encode(image_bytes).decode("utf-8")
-                return image_base64
+                return base64.b64encode(screenshot_path.read_bytes()).decode("ascii")
             except Exception as e2:
                 logger.warning(f"编码截图失败: {e2}")
                 return None
     
-    def _cleanup_temp_files(self):
-        """
-        清理临时文件（防止沙盒目录溢出）
-        
-        清理所有在图片预处理过程中创建的临时压缩文件。
-        """
-        cleaned_count = 0
-        for temp_file in self._temp_files:
-            try:
-                if temp_file.exists():
-                    temp_file.unlink()
-                    cleaned_count += 1
-            except Exception as e:
-                logger.warning(f"[SECURITY_SHIELD] 清理临时文件失败: {temp_file} - {e}")
-        
-        if cleaned_count > 0:
-            logger.debug(f"[SECURITY_SHIELD] 已清理 {cleaned_count} 个临时文件")
-        
-        # 清空列表
-        self._temp_files.clear()
-    
     def _extract_ocr_info(self, screenshot_path: Optional[Path]) -> Optional[str]:
         """
         使用OCR提取截图中的文本信息（用于不支持视觉的模型）
@@ -523,7 +741,7 @@ class Reflector:
         return None
     
     def _build_reflection_prompt(self, step: Dict[str, Any], error: str, context: str, screenshot_data: Optional[str] = None, screenshot_info: Optional[Dict[str, Any]] = None) -> str:
-        # 构建基础提示词
+        # 构建本次失败的动态上下文（固定的修复规则在 _STATIC_INSTRUCTIONS 中，随 system 发送）
         prompt = f"""
 The following agent step failed during execution.
 Please analyze the error and provide a fixed version of the step if possible.
@@ -619,61 +837,4 @@ When returning coordinates, you **MUST** also include a `visual_description` fie
 - For form filling, prefer `browser_fill` with coordinates over `browser_click` + `keyboard_type` (single step is more reliable)
 """
         
-        prompt += """
-**Instructions**:
-1. Analyze why the step failed (e.g., SyntaxError, FileNotFoundError, Invalid Parameter, ElementNotFound).
-2. If the error is specific to Python script content (e.g., SyntaxError, missing import), rewrite the 'code' or 'script' parameter in the `modified_step`.
-3. If the path was wrong, try to correct it based on common conventions or safety rules (e.g. use `~/Desktop`).
-4. **For browser errors with selectors**: If you have a screenshot, analyze it visually to find the correct selector or use coordinates.
-5. **Important**: Return a JSON object with the following structure:
-{{
-    "is_retryable": boolean,      // Can we try again with a fix?
-    "reason": "string",           // Brief explanation of the fix
-    "modified_step": object|null  // The complete, corrected step object (or null if not retryable)
-}}
-
-**Rules for Fixes**:
-- If it's a Python Syntax Error, fix the code.
-- If it's a "File Not Found" for a screenshot/download, ensure the path exists or use a more robust path.
-- If it's a browser selector error and you have a screenshot, analyze the screenshot to find the correct selector or coordinates.
-- Keep the `type` of the step the same unless the tool itself was wrong.
-- **For coordinate-based fixes**: You can change `browser_fill` to `browser_click` + `keyboard_type` if the selector is unreliable.
-
-**NON-RETRYABLE ERRORS (Set is_retryable: false)**:
-These errors require **user configuration** and cannot be fixed by modifying the step:
-- **Configuration errors**: Missing API Key, wrong provider/model configuration (e.g., "DeepSeek 不支持视觉功能", "VLM不可用：未配置API Key")
-- **Missing dependencies**: Missing Python packages that require manual installation (e.g., "ddddocr 未安装", "pip install ddddocr")
-- **System requirements**: Missing system tools or permissions that require user action
-- **Invalid configuration**: Provider/model mismatch (e.g., using DeepSeek for vision tasks)
-
-**When you see these errors**:
-- Set `is_retryable: false`
-- Set `modified_step: null`
-- In `reason`, explain: "This error requires user configuration. [具体说明需要用户做什么]"
-
-**Examples of NON-RETRYABLE errors**:
-- "VLM不可用：DeepSeek 不支持视觉功能" → `is_retryable: false` (用户需要切换模型)
-- "OCR不可用：ddddocr 未安装" → `is_retryable: false` (用户需要安装依赖)
-- "视觉分析失败：VLM和OCR均不可用" + 包含配置建议 → `is_retryable: false` (用户需要配置)
-
-**CRITICAL: Parameter Extraction Rules**:
-- **NEVER use placeholders** like `[REPLACE_WITH_ACTUAL_APP_NAME]`, `extract_from_context_or_ask_user`, or any text containing `[ ]` brackets.
-- **ALWAYS extract real values** from the `Context` or `Failed Step`:
-  - If `app_name` is missing, extract it from the original instruction in Context (e.g., "打开汽水音乐" → "汽水音乐").
-  - If `file_path` is missing, extract it from Context or use safe defaults (e.g., `~/Desktop`).
-  - If you cannot find the real value in Context, set `is_retryable: false` and explain why.
-- **Forbidden patterns** (DO NOT USE):
-  - `[REPLACE_WITH_ACTUAL_APP_NAME]`
-  - `extract_from_context_or_ask_user`
-  - `[ANY_TEXT_IN_BRACKETS]`
-  - `placeholder`, `TODO`, `FIXME`
-- **If a required parameter is missing and cannot be extracted**:
-  - Set `is_retryable: false`
-  - In `reason`, explain: "Cannot extract [parameter_name] from context. User must provide it explicitly."
-- **Example of CORRECT fix**:
-  - Error: "缺少app_name参数"
-  - Context: "用户指令: 打开汽水音乐"
-  - Fix: `{{"params": {{"app_name": "汽水音乐"}}}}` ✅
-- **Example of WRONG fix**:
-  - Fix: `{{"params": {{"app_name": "[REPLACE_WITH_ACTUAL_APP_NAME]"}}}}` ❌
-"""
+        return prompt
@@ -38,6 +38,11 @@ import threading
 from pathlib import Path
 from typing import Dict, Any
 
+try:
+    import orjson  # 可选：C 实现，直接输出 UTF-8，中文事件无需逐字符转义
+except ImportError:
+    orjson = None
+
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -58,6 +63,22 @@ def is_stopped(request_id: str) -> bool:
 def send_event(event: Dict[str, Any]) -> None:
     """发送 JSON 事件到 stdout（一行一个，Tauri 逐行读取）"""
     try:
+        if orjson is not None:
+            try:
+                data = orjson.dumps(event) + b"\n"
+            except TypeError:
+                data = None  # orjson 不支持的类型（如非 str 键），回退到标准 json
+            buffer = getattr(sys.stdout, "buffer", None)
+            if data is not None and buffer is not None:
+                sys.stdout.flush()  # 先刷出文本层缓冲，保证与 buffer 写入的顺序一致
+                buffer.write(data)
+                sys.stdout.flush()
+                return
+            if data is not None:
+                # stdout 被替换为无 buffer 的对象（如 StringIO）时按文本写入
+                sys.stdout.write(data.decode("utf-8"))
+                sys.stdout.flush()
+                return
         line = json.dumps(event, ensure_ascii=False)
         sys.stdout.write(line + "\n")
         sys.stdout.flush()  # 🔴 CRITICAL: 立即刷新缓冲区，确保消息立即发送
@@ -190,6 +190,11 @@ class Config:
     def log_level(self) -> str:
         """获取日志级别"""
         return self.get("log_level", "INFO")
+    
+    @property
+    def vector_index(self) -> Optional[Dict[str, Any]]:
+        """获取向量索引参数（如 {"hnsw:M": 8, "hnsw:search_ef": 20}），未配置时返回 None"""
+        return self.get("vector_index") or None
 
     @property
     def email_sender(self) -> Optional[str]:
@@ -142,6 +142,15 @@ class TestKnowledgeGraph:
         assert len(results) == 1
         assert results[0]["subject"] == "用户"
 
+    def test_query_knowledge_exact(self, memory):
+        """测试精确匹配查询（不做子串匹配）"""
+        memory.add_knowledge("用户", "使用", "VSCode")
+        memory.add_knowledge("用户组", "包含", "管理员")
+
+        assert len(memory.query_knowledge(subject="用户")) == 2
+        results = memory.query_knowledge(subject="用户", exact=True)
+        assert [r["object"] for r in results] == ["VSCode"]
+
 
 class TestMemoryContext:
     """记忆上下文测试"""
@@ -229,6 +238,51 @@ class TestMemoryContext:
             # 如果发生异常，连接应该已经回滚
             pass
 
+    def test_search_files_substring(self, memory):
+        """测试文件搜索按子串匹配（长关键词走全文索引，短关键词走 LIKE）"""
+        memory.add_file_record("/Users/test/文档/季度报告.pdf", tags=["工作"])
+        memory.add_file_record("/tmp/Photo.PNG")
+        
+        assert [f["path"] for f in memory.search_files("test/文档")] == ["/Users/test/文档/季度报告.pdf"]
+        assert [f["path"] for f in memory.search_files("photo")] == ["/tmp/Photo.PNG"]
+        assert len(memory.search_files("工作")) == 1
+        assert memory.search_files("not-there") == []
+
+    def test_record_habits_batch(self, memory):
+        """测试批量记录习惯：已有习惯累加次数，新习惯直接插入"""
+        memory.record_habit("action", "下载")
+        memory.record_habits({("action", "下载"): 2, ("file_type", ".pdf"): 3})
+        
+        habits = {(h["pattern_type"], h["pattern_value"]): h["frequency"] for h in memory.get_habits()}
+        assert habits == {("action", "下载"): 3, ("file_type", ".pdf"): 3}
+
+    def test_transaction_commits_and_rolls_back(self, memory):
+        """测试显式事务：正常退出一次性提交，异常时整体回滚"""
+        with memory.transaction():
+            memory.add_file_record("/path/to/a.txt")
+            memory.record_habit("action", "下载")
+        
+        assert len(memory.get_recent_files()) == 1
+        assert len(memory.get_habits()) == 1
+        
+        with pytest.raises(RuntimeError):
+            with memory.transaction():
+                memory.add_file_record("/path/to/b.txt")
+                raise RuntimeError("boom")
+        
+        assert len(memory.get_recent_files()) == 1
+
+    def test_memory_context_cache_invalidated_by_writes(self, memory):
+        """测试记忆上下文缓存：无写入时复用，写入后重新生成"""
+        memory.set_preference("theme", "dark")
+        first = memory.get_memory_context()
+        assert memory.get_memory_context() is first
+
+        memory.add_file_record("/path/to/report.pdf")
+        refreshed = memory.get_memory_context()
+        assert "/path/to/report.pdf" in refreshed
+        assert "theme" in refreshed
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])